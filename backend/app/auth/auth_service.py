@@ -1,10 +1,19 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from threading import Lock
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 from backend.app.models import doctor as doctor_models
 from backend.app.models import patient as patient_models
 from backend.database import get_db
@@ -14,6 +23,13 @@ SECRET_KEY = "your-secret-key-change-in-production-min-32-chars"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 ore
 
+# Massimo di operazioni bcrypt (login, registrazione) in parallelo
+AUTH_MAX_CONCURRENCY = int(os.getenv("AUTH_MAX_CONCURRENCY", "4"))
+
+# Cache degli utenti autenticati
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_SIZE = 10000
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -28,6 +44,23 @@ def get_password_hash(password: str) -> str:
     """Genera hash della password"""
     return pwd_context.hash(password)
 
+# Pool dedicato a bcrypt: il lavoro di login e registrazione non occupa l'event
+# loop né il threadpool condiviso dalle altre route. La lettura dell'utente in
+# get_current_user resta nel threadpool condiviso, così le richieste autenticate
+# non si mettono in coda dietro a un'ondata di login.
+password_executor = ThreadPoolExecutor(max_workers=AUTH_MAX_CONCURRENCY, thread_name_prefix="bcrypt")
+
+async def run_in_password_pool(func, *args):
+    """Esegue una funzione che usa bcrypt nel pool dedicato"""
+    loop = asyncio.get_running_loop()
+    # Il contesto segue la chiamata, così le query contano nelle metriche della richiesta
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(password_executor, context.run, func, *args)
+
+def hash_password_in_pool(password: str) -> str:
+    """get_password_hash per route sincrone, limitato da AUTH_MAX_CONCURRENCY"""
+    return password_executor.submit(get_password_hash, password).result()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Crea un JWT token"""
     to_encode = data.copy()
@@ -79,6 +112,144 @@ def authenticate_doctor(db: Session, email: str, password: str):
     
     return doctor
 
+class CurrentUser:
+    """Utente autenticato: solo i campi usati dalle route, senza password o note mediche"""
+
+    __slots__ = (
+        'id', 'user_type', 'attivo', 'nome', 'cognome', 'email', 'telefono',
+        'codice_fiscale', 'data_nascita', 'specializzazione'
+    )
+
+    def __init__(self, user_type: str, row):
+        self.user_type = user_type
+        self.id = row.id
+        self.attivo = row.attivo
+        self.nome = row.nome
+        self.cognome = row.cognome
+        self.email = row.email
+        self.telefono = row.telefono
+        self.codice_fiscale = getattr(row, 'codice_fiscale', None)
+        self.data_nascita = getattr(row, 'data_nascita', None)
+        self.specializzazione = getattr(row, 'specializzazione', None)
+
+
+class UserCache:
+    """LRU con scadenza (user_type, user_id) -> CurrentUser"""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, user: CurrentUser) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, user)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: tuple) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(user_type: str, user_id: int) -> None:
+    """Da chiamare quando un utente viene modificato o disattivato con un update Core.
+
+    Le modifiche tramite ORM invalidano la cache da sole, al commit (vedi sotto).
+    """
+    user_cache.invalidate((user_type, user_id))
+
+
+# Campi di pazienti e medici copiati in CurrentUser
+CURRENT_USER_FIELDS = frozenset(CurrentUser.__slots__) - {'user_type'}
+
+PENDING_USERS_KEY = "invalidate_users"
+
+
+def _queue_user_invalidation(user_type: str, target, check_fields: bool) -> None:
+    if check_fields:
+        state = inspect(target)
+        if not any(
+            state.attrs[field].history.has_changes()
+            for field in CURRENT_USER_FIELDS if field in state.attrs
+        ):
+            return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_USERS_KEY, set()).add((user_type, target.id))
+
+
+# Ogni update o delete ORM di un utente (qualunque route o script) lo toglie dalla
+# cache dopo il commit: prima, un'altra richiesta potrebbe rimetterci i dati vecchi
+for _user_type, _model in (("patient", patient_models.Patient), ("doctor", doctor_models.Doctor)):
+    event.listen(_model, "after_update",
+                 lambda mapper, connection, target, user_type=_user_type:
+                 _queue_user_invalidation(user_type, target, True))
+    event.listen(_model, "after_delete",
+                 lambda mapper, connection, target, user_type=_user_type:
+                 _queue_user_invalidation(user_type, target, False))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for key in session.info.pop(PENDING_USERS_KEY, ()):
+        user_cache.invalidate(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_users(session):
+    session.info.pop(PENDING_USERS_KEY, None)
+
+
+def load_current_user(db: Session, user_type: str, user_id: int) -> Optional[CurrentUser]:
+    """Carica i soli campi di CurrentUser per un paziente o un medico"""
+    if user_type == "patient":
+        Patient = patient_models.Patient
+        row = db.query(
+            Patient.id, Patient.attivo, Patient.nome, Patient.cognome, Patient.email,
+            Patient.telefono, Patient.codice_fiscale, Patient.data_nascita
+        ).filter(Patient.id == user_id).first()
+    else:
+        Doctor = doctor_models.Doctor
+        row = db.query(
+            Doctor.id, Doctor.attivo, Doctor.nome, Doctor.cognome, Doctor.email,
+            Doctor.telefono, Doctor.specializzazione
+        ).filter(Doctor.id == user_id).first()
+    return CurrentUser(user_type, row) if row else None
+
 # Dependency per ottenere l'utente corrente dal token
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -98,19 +269,22 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Convert string to int for database query
-    user_id = int(user_id_str)
-    
-    if user_type == "patient":
-        user = db.query(patient_models.Patient).filter(patient_models.Patient.id == user_id).first()
-    elif user_type == "doctor":
-        user = db.query(doctor_models.Doctor).filter(doctor_models.Doctor.id == user_id).first()
-    else:
+    if user_type not in ("patient", "doctor"):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Tipo utente non valido",
         )
     
+    # Convert string to int for database query
+    user_id = int(user_id_str)
+    
+    cache_key = (user_type, user_id)
+    user = user_cache.get(cache_key)
+    if user is None:
+        user = await run_in_threadpool(load_current_user, db, user_type, user_id)
+        if user is not None:
+            user_cache.put(cache_key, user)
+    
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -123,8 +297,6 @@ async def get_current_user(
             detail="Account disattivato",
         )
     
-    # Aggiungi il tipo di utente all'oggetto
-    user.user_type = user_type
     return user
 
 # Dependency per richiedere che l'utente sia un paziente
@@ -1,5 +1,7 @@
 from .room import Room
 from .appointment import Appointment
+from .appointment_slot import AppointmentSlot
 from .doctor import Doctor
 from .patient import Patient
+from .patient_search_token import PatientSearchToken
 from .watiting_list import WaitingList
\ No newline at end of file
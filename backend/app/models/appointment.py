@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Time, Text, ForeignKey, Enum, TIMESTAMP
+from sqlalchemy import Column, Integer, String, Date, Time, Text, ForeignKey, Enum, TIMESTAMP, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from backend.database import Base
@@ -7,8 +7,8 @@ class Appointment(Base):
     __tablename__ = "appointments"
     
     id = Column(Integer, primary_key=True, index=True)
-    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
     room_id = Column(Integer, ForeignKey("rooms.id"))
     data_appuntamento = Column(Date, nullable=False, index=True)
     ora_inizio = Column(Time, nullable=False)
@@ -26,4 +26,13 @@ class Appointment(Base):
     
     doctor = relationship("Doctor", back_populates="appointments")
     patient = relationship("Patient", back_populates="appointments")
-    room = relationship("Room", back_populates="appointments")
\ No newline at end of file
+    room = relationship("Room", back_populates="appointments")
+    
+    __table_args__ = (
+        # Conflitti medico e ricerca slot: copre (data, ora_inizio, durata) senza leggere la riga
+        Index('ix_appointments_doctor_data_stato', doctor_id, data_appuntamento, stato, ora_inizio, durata_minuti),
+        # Conflitti sala e vista giornaliera delle sale
+        Index('ix_appointments_room_data_ora', room_id, data_appuntamento, ora_inizio),
+        # Storico paziente ordinato per data e ora
+        Index('ix_appointments_patient_data_ora', patient_id, data_appuntamento, ora_inizio),
+    )
\ No newline at end of file
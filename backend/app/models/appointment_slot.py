@@ -0,0 +1,73 @@
+from typing import List, Optional
+from datetime import date, time
+from sqlalchemy import Column, Integer, SmallInteger, Date, Enum, ForeignKey, delete, event, inspect, insert
+from backend.database import Base
+from .appointment import Appointment
+
+# Granularità delle unità di occupazione: orari non multipli vengono arrotondati verso l'esterno
+SLOT_UNIT_MINUTES = 5
+
+# Campi che cambiano le unità occupate da un appuntamento
+SLOT_FIELDS = ("doctor_id", "room_id", "data_appuntamento", "ora_inizio", "durata_minuti", "stato")
+
+class AppointmentSlot(Base):
+    """Occupazione materializzata: una riga per risorsa, giorno e unità da SLOT_UNIT_MINUTES.
+
+    La chiave primaria rende atomico il controllo dei conflitti: due transazioni
+    concorrenti che prenotano unità sovrapposte non possono fare entrambe commit.
+    """
+    __tablename__ = "appointment_slots"
+
+    risorsa = Column(Enum('medico', 'sala', name='slot_risorsa_enum'), primary_key=True)
+    resource_id = Column(Integer, primary_key=True)
+    data = Column(Date, primary_key=True)
+    unita = Column(SmallInteger, primary_key=True)
+    appointment_id = Column(
+        Integer, ForeignKey("appointments.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+
+def slot_rows(appointment_id: int, doctor_id: int, room_id: Optional[int], giorno: date,
+              ora_inizio: time, durata_minuti: Optional[int]) -> List[dict]:
+    """Righe di occupazione di un appuntamento attivo (medico e, se presente, sala)"""
+    start = ora_inizio.hour * 60 + ora_inizio.minute
+    end = min(start + (durata_minuti or 30), 24 * 60)
+    units = range(start // SLOT_UNIT_MINUTES, -(-end // SLOT_UNIT_MINUTES))
+    resources = [("medico", doctor_id)] + ([("sala", room_id)] if room_id else [])
+    return [
+        {"risorsa": risorsa, "resource_id": resource_id, "data": giorno, "unita": unita,
+         "appointment_id": appointment_id}
+        for risorsa, resource_id in resources
+        for unita in units
+    ]
+
+def appointment_slot_rows(appointment) -> List[dict]:
+    if appointment.stato == 'cancellato':
+        return []
+    return slot_rows(
+        appointment.id, appointment.doctor_id, appointment.room_id,
+        appointment.data_appuntamento, appointment.ora_inizio, appointment.durata_minuti
+    )
+
+def is_slot_conflict(error) -> bool:
+    """True se l'IntegrityError viene dalla chiave di appointment_slots"""
+    return "appointment_slots" in str(getattr(error, "orig", error))
+
+# L'occupazione segue automaticamente gli insert/update ORM degli appuntamenti
+# (creazione, spostamento, cancellazione); gli insert Core la scrivono a parte
+@event.listens_for(Appointment, "after_insert")
+def _reserve_slots(mapper, connection, appointment):
+    rows = appointment_slot_rows(appointment)
+    if rows:
+        connection.execute(insert(AppointmentSlot), rows)
+
+@event.listens_for(Appointment, "after_update")
+def _move_slots(mapper, connection, appointment):
+    state = inspect(appointment)
+    if not any(state.attrs[field].history.has_changes() for field in SLOT_FIELDS):
+        return
+    connection.execute(
+        delete(AppointmentSlot).where(AppointmentSlot.appointment_id == appointment.id)
+    )
+    rows = appointment_slot_rows(appointment)
+    if rows:
+        connection.execute(insert(AppointmentSlot), rows)
@@ -0,0 +1,61 @@
+import re
+import unicodedata
+from typing import List, Set
+from sqlalchemy import Column, Integer, String, ForeignKey, delete, event, inspect, insert
+from backend.database import Base
+from .patient import Patient
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+SEARCH_FIELDS = ("nome", "cognome", "codice_fiscale")
+
+class PatientSearchToken(Base):
+    """Indice di ricerca: un token normalizzato (nome, cognome, codice fiscale) per riga"""
+    __tablename__ = "patient_search_tokens"
+    
+    # La chiave primaria inizia dal token: la ricerca per prefisso è un range sull'indice
+    token = Column(String(100), primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+def normalize(value: str) -> List[str]:
+    """'D'Angelo Nicolò' -> ['d', 'angelo', 'nicolo']"""
+    if not value:
+        return []
+    decomposed = unicodedata.normalize("NFKD", value)
+    ascii_text = decomposed.encode("ascii", "ignore").decode().lower()
+    return [token for token in _TOKEN_SPLIT.split(ascii_text) if token]
+
+def patient_tokens(nome: str, cognome: str, codice_fiscale: str) -> Set[str]:
+    cognome_tokens = normalize(cognome)
+    tokens = set(normalize(nome)) | set(cognome_tokens) | set(normalize(codice_fiscale))
+    # Cognomi composti ('De Luca') cercabili anche come parola unica ('deluca')
+    if len(cognome_tokens) > 1:
+        tokens.add("".join(cognome_tokens))
+    return {token[:100] for token in tokens}
+
+def token_rows(patient_id: int, nome: str, cognome: str, codice_fiscale: str) -> List[dict]:
+    return [
+        {"token": token, "patient_id": patient_id}
+        for token in patient_tokens(nome, cognome, codice_fiscale)
+    ]
+
+# L'indice segue automaticamente gli insert/update ORM dei pazienti
+@event.listens_for(Patient, "after_insert")
+def _index_new_patient(mapper, connection, patient):
+    connection.execute(
+        insert(PatientSearchToken),
+        token_rows(patient.id, patient.nome, patient.cognome, patient.codice_fiscale)
+    )
+
+@event.listens_for(Patient, "after_update")
+def _reindex_patient(mapper, connection, patient):
+    state = inspect(patient)
+    if not any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS):
+        return
+    connection.execute(
+        delete(PatientSearchToken).where(PatientSearchToken.patient_id == patient.id)
+    )
+    connection.execute(
+        insert(PatientSearchToken),
+        token_rows(patient.id, patient.nome, patient.cognome, patient.codice_fiscale)
+    )
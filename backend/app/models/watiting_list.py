@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Enum, TIMESTAMP
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, Boolean, ForeignKey, Enum, TIMESTAMP, Computed, Index
 from sqlalchemy.sql import func
 from backend.database import Base
 
+# Rango clinico della priorità (più alto = più urgente)
+PRIORITA_RANK = {'bassa': 1, 'media': 2, 'alta': 3, 'urgente': 4}
+
 class WaitingList(Base):
     __tablename__ = "waiting_list"
     
@@ -15,6 +18,22 @@ class WaitingList(Base):
         default='media',
         index=True
     )
+    # Colonna generata dal database: l'ordinamento per rango è servito da indice
+    priorita_rank = Column(
+        SmallInteger,
+        Computed(
+            "CASE priorita " +
+            " ".join(f"WHEN '{p}' THEN {r}" for p, r in PRIORITA_RANK.items()) +
+            " ELSE 0 END",
+            persisted=True
+        )
+    )
     note = Column(Text)
     data_richiesta = Column(TIMESTAMP, server_default=func.now())
-    notificato = Column(Boolean, default=False)
\ No newline at end of file
+    notificato = Column(Boolean, default=False)
+    
+    __table_args__ = (
+        Index('ix_waiting_list_coda', priorita_rank.desc(), data_richiesta, id),
+        Index('ix_waiting_list_spec_coda', specializzazione, priorita_rank.desc(), data_richiesta, id),
+        Index('ix_waiting_list_doctor_coda', doctor_id, priorita_rank.desc(), data_richiesta, id),
+    )
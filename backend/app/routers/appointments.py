@@ -1,68 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from contextlib import contextmanager
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional
-from datetime import date, datetime, timedelta
+from sqlalchemy import insert, select
+from typing import Iterator, List, Optional
+from datetime import date, datetime, time, timedelta
 from backend.app import models
+from backend.app.models.appointment_slot import is_slot_conflict, slot_rows
 from backend.app.schemas import appointment as schemas
-from backend.database import get_db
+from backend.database import get_read_db, get_write_db, read_session_factory
 from backend.app.auth.auth_service import get_current_user, get_current_patient
+from backend.app.services.scheduling import SLOT_MINUTES, DoctorSchedule, iter_free_masks, iter_free_slots
+from backend.app.services.availability import load_busy_masks, invalidate_doctor_days
+from backend.app.services.availability_events import availability_events, publish_availability
+from backend.app.services.pagination import DATE_TIME_ID, decode_cursor, keyset_filter, set_next_cursor, split_page
+from backend.app.services.export import EXPORT_MEDIA_TYPES, export_chunks, iter_batches
+from backend.app.services.booking import appointment_interval, find_conflict, load_interval_index
+from backend.app.services.serialization import FastJSONResponse, RowSerializer
 
 router = APIRouter()
 
 MINIMUM_NOTICE_HOURS = 24
+MAX_PAGE_LIMIT = 500
+MAX_BULK_APPOINTMENTS = 500
 
-@router.get("/", response_model=List[schemas.Appointment])
-def get_appointments(
-    skip: int = 0,
-    limit: int = 100,
+# Formati di available-slots: un oggetto per slot (default) o bitmask per medico e giorno
+SLOT_FORMATS = ("full", "compact")
+
+# Ordinamento stabile per la paginazione keyset degli appuntamenti
+APPOINTMENT_SORT = (
+    models.Appointment.data_appuntamento,
+    models.Appointment.ora_inizio,
+    models.Appointment.id
+)
+
+# Lista appuntamenti: solo le colonne dello schema, serializzate senza rivalidazione
+APPOINTMENT_SERIALIZER = RowSerializer(schemas.Appointment)
+
+def appointment_sort_key(apt):
+    return (apt.data_appuntamento, apt.ora_inizio, apt.id)
+
+def appointments_statement(
+    current_user,
     doctor_id: Optional[int] = None,
     patient_id: Optional[int] = None,
     data_from: Optional[date] = None,
     data_to: Optional[date] = None,
     stato: Optional[str] = None,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None
 ):
-    """Ottieni lista appuntamenti con filtri - Solo i propri appuntamenti per i pazienti"""
-    query = db.query(models.Appointment)
+    """Query della lista appuntamenti con filtri e visibilità per tipo utente"""
+    stmt = select(models.Appointment)
     
     # Se è un paziente, può vedere solo i propri appuntamenti
     if hasattr(current_user, 'user_type') and current_user.user_type == "patient":
-        query = query.filter(models.Appointment.patient_id == current_user.id)
+        stmt = stmt.where(models.Appointment.patient_id == current_user.id)
     
     # Se è un medico, può vedere solo i propri appuntamenti
     if hasattr(current_user, 'user_type') and current_user.user_type == "doctor":
-        query = query.filter(models.Appointment.doctor_id == current_user.id)
+        stmt = stmt.where(models.Appointment.doctor_id == current_user.id)
     
     if doctor_id:
-        query = query.filter(models.Appointment.doctor_id == doctor_id)
+        stmt = stmt.where(models.Appointment.doctor_id == doctor_id)
     if patient_id:
-        query = query.filter(models.Appointment.patient_id == patient_id)
+        stmt = stmt.where(models.Appointment.patient_id == patient_id)
     if data_from:
-        query = query.filter(models.Appointment.data_appuntamento >= data_from)
+        stmt = stmt.where(models.Appointment.data_appuntamento >= data_from)
     if data_to:
-        query = query.filter(models.Appointment.data_appuntamento <= data_to)
+        stmt = stmt.where(models.Appointment.data_appuntamento <= data_to)
     if stato:
-        query = query.filter(models.Appointment.stato == stato)
-    
-    appointments = query.order_by(
-        models.Appointment.data_appuntamento.desc(),
-        models.Appointment.ora_inizio.desc()
-    ).offset(skip).limit(limit).all()
+        stmt = stmt.where(models.Appointment.stato == stato)
+    if cursor:
+        stmt = stmt.where(keyset_filter(APPOINTMENT_SORT, decode_cursor(cursor, DATE_TIME_ID)))
     
-    return appointments
+    return stmt.order_by(*(column.desc() for column in APPOINTMENT_SORT))
 
-@router.get("/detailed")
-def get_appointments_detailed(
+def appointments_list_statement(current_user, doctor_id, patient_id, data_from, data_to, stato,
+                                cursor: Optional[str], skip: int, limit: int):
+    """Pagina della lista appuntamenti (una riga in più per il cursore) con le sole colonne dello schema"""
+    stmt = appointments_statement(current_user, doctor_id, patient_id, data_from, data_to, stato, cursor)
+    if not cursor:
+        stmt = stmt.offset(skip)
+    return stmt.with_only_columns(*APPOINTMENT_SERIALIZER.columns(models.Appointment)).limit(limit + 1)
+
+def appointments_page_response(rows, limit: int) -> FastJSONResponse:
+    appointments, next_cursor = split_page(rows, limit, key=appointment_sort_key)
+    response = FastJSONResponse(APPOINTMENT_SERIALIZER.many(appointments))
+    set_next_cursor(response, next_cursor)
+    return response
+
+def detailed_statement(
+    current_user,
     doctor_id: Optional[int] = None,
     patient_id: Optional[int] = None,
     data: Optional[date] = None,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None
 ):
-    """Ottieni appuntamenti con dettagli completi - Autenticazione richiesta"""
-    query = db.query(
+    """Query degli appuntamenti con medico, paziente e sala, in ordine cronologico"""
+    stmt = select(
         models.Appointment,
         models.Doctor,
         models.Patient,
@@ -77,140 +113,391 @@ def get_appointments_detailed(
     
     # Filtri basati sul tipo di utente
     if hasattr(current_user, 'user_type') and current_user.user_type == "patient":
-        query = query.filter(models.Appointment.patient_id == current_user.id)
+        stmt = stmt.where(models.Appointment.patient_id == current_user.id)
     elif hasattr(current_user, 'user_type') and current_user.user_type == "doctor":
-        query = query.filter(models.Appointment.doctor_id == current_user.id)
+        stmt = stmt.where(models.Appointment.doctor_id == current_user.id)
     
     if doctor_id:
-        query = query.filter(models.Appointment.doctor_id == doctor_id)
+        stmt = stmt.where(models.Appointment.doctor_id == doctor_id)
     if patient_id:
-        query = query.filter(models.Appointment.patient_id == patient_id)
+        stmt = stmt.where(models.Appointment.patient_id == patient_id)
     if data:
-        query = query.filter(models.Appointment.data_appuntamento == data)
-    
-    results = query.all()
-    
-    detailed_appointments = []
-    for apt, doctor, patient, room in results:
-        detailed_appointments.append({
-            "id": apt.id,
-            "data_appuntamento": str(apt.data_appuntamento),
-            "ora_inizio": str(apt.ora_inizio),
-            "durata_minuti": apt.durata_minuti,
-            "tipo_visita": apt.tipo_visita,
-            "stato": apt.stato,
-            "note": apt.note,
-            "nome_medico": f"{doctor.nome} {doctor.cognome}",
-            "specializzazione": doctor.specializzazione,
-            "nome_paziente": f"{patient.nome} {patient.cognome}",
-            "telefono_paziente": patient.telefono,
-            "email_paziente": patient.email,
-            "sala_numero": room.numero if room else None,
-            "sala_nome": room.nome if room else None
-        })
+        stmt = stmt.where(models.Appointment.data_appuntamento == data)
+    if cursor:
+        stmt = stmt.where(
+            keyset_filter(APPOINTMENT_SORT, decode_cursor(cursor, DATE_TIME_ID), descending=False)
+        )
     
-    return detailed_appointments
+    return stmt.order_by(*APPOINTMENT_SORT)
 
-@router.get("/available-slots")
-def get_available_slots(
-    specializzazione: Optional[str] = None,
+def detailed_page_limit(limit: Optional[int], cursor: Optional[str]) -> Optional[int]:
+    """Senza limit né cursore /detailed restituisce tutto (compatibilità)"""
+    if limit is None and not cursor:
+        return None
+    return max(1, min(limit or 100, MAX_PAGE_LIMIT))
+
+def detailed_entry(apt, doctor, patient, room) -> dict:
+    return {
+        "id": apt.id,
+        "data_appuntamento": str(apt.data_appuntamento),
+        "ora_inizio": str(apt.ora_inizio),
+        "durata_minuti": apt.durata_minuti,
+        "tipo_visita": apt.tipo_visita,
+        "stato": apt.stato,
+        "note": apt.note,
+        "nome_medico": f"{doctor.nome} {doctor.cognome}",
+        "specializzazione": doctor.specializzazione,
+        "nome_paziente": f"{patient.nome} {patient.cognome}",
+        "telefono_paziente": patient.telefono,
+        "email_paziente": patient.email,
+        "sala_numero": room.numero if room else None,
+        "sala_nome": room.nome if room else None
+    }
+
+# Colonne dell'export: quelle di /detailed più gli id
+EXPORT_COLUMNS = (
+    "id", "data_appuntamento", "ora_inizio", "durata_minuti", "tipo_visita", "stato", "note",
+    "doctor_id", "nome_medico", "specializzazione",
+    "patient_id", "nome_paziente", "telefono_paziente", "email_paziente",
+    "room_id", "sala_numero", "sala_nome"
+)
+
+def export_statement(
+    current_user,
     doctor_id: Optional[int] = None,
-    start_date: date = None,
-    end_date: date = None,
-    db: Session = Depends(get_db)
+    patient_id: Optional[int] = None,
+    data_from: Optional[date] = None,
+    data_to: Optional[date] = None,
+    stato: Optional[str] = None
 ):
-    """Ottieni slot disponibili per specializzazione o medico"""
+    """Come detailed_statement, ma solo colonne (nessun oggetto ORM) e intervallo di date"""
+    stmt = select(
+        models.Appointment.id,
+        models.Appointment.data_appuntamento,
+        models.Appointment.ora_inizio,
+        models.Appointment.durata_minuti,
+        models.Appointment.tipo_visita,
+        models.Appointment.stato,
+        models.Appointment.note,
+        models.Appointment.doctor_id,
+        models.Doctor.nome.label("medico_nome"),
+        models.Doctor.cognome.label("medico_cognome"),
+        models.Doctor.specializzazione,
+        models.Appointment.patient_id,
+        models.Patient.nome.label("paziente_nome"),
+        models.Patient.cognome.label("paziente_cognome"),
+        models.Patient.telefono,
+        models.Patient.email,
+        models.Appointment.room_id,
+        models.Room.numero.label("sala_numero"),
+        models.Room.nome.label("sala_nome")
+    ).join(
+        models.Doctor, models.Appointment.doctor_id == models.Doctor.id
+    ).join(
+        models.Patient, models.Appointment.patient_id == models.Patient.id
+    ).outerjoin(
+        models.Room, models.Appointment.room_id == models.Room.id
+    )
+    
+    if current_user.user_type == "patient":
+        stmt = stmt.where(models.Appointment.patient_id == current_user.id)
+    elif current_user.user_type == "doctor":
+        stmt = stmt.where(models.Appointment.doctor_id == current_user.id)
+    
+    if doctor_id:
+        stmt = stmt.where(models.Appointment.doctor_id == doctor_id)
+    if patient_id:
+        stmt = stmt.where(models.Appointment.patient_id == patient_id)
+    if data_from:
+        stmt = stmt.where(models.Appointment.data_appuntamento >= data_from)
+    if data_to:
+        stmt = stmt.where(models.Appointment.data_appuntamento <= data_to)
+    if stato:
+        stmt = stmt.where(models.Appointment.stato == stato)
+    
+    return stmt.order_by(*APPOINTMENT_SORT)
+
+def export_entry(row) -> dict:
+    return {
+        "id": row.id,
+        "data_appuntamento": str(row.data_appuntamento),
+        "ora_inizio": str(row.ora_inizio),
+        "durata_minuti": row.durata_minuti,
+        "tipo_visita": row.tipo_visita,
+        "stato": row.stato,
+        "note": row.note,
+        "doctor_id": row.doctor_id,
+        "nome_medico": f"{row.medico_nome} {row.medico_cognome}",
+        "specializzazione": row.specializzazione,
+        "patient_id": row.patient_id,
+        "nome_paziente": f"{row.paziente_nome} {row.paziente_cognome}",
+        "telefono_paziente": row.telefono,
+        "email_paziente": row.email,
+        "room_id": row.room_id,
+        "sala_numero": row.sala_numero,
+        "sala_nome": row.sala_nome
+    }
+
+def slot_doctors_statement(specializzazione: Optional[str], doctor_id: Optional[int]):
+    """Medici candidati per la ricerca slot (solo le colonne usate)"""
+    stmt = select(
+        models.Doctor.id,
+        models.Doctor.nome,
+        models.Doctor.cognome,
+        models.Doctor.specializzazione,
+        models.Doctor.orario_inizio,
+        models.Doctor.orario_fine,
+        models.Doctor.giorni_disponibili
+    )
+    if doctor_id:
+        stmt = stmt.where(models.Doctor.id == doctor_id)
+    elif specializzazione:
+        stmt = stmt.where(models.Doctor.specializzazione == specializzazione)
+    return stmt
+
+def slot_date_range(start_date: Optional[date], end_date: Optional[date]):
     if not start_date:
         start_date = date.today()
     if not end_date:
         end_date = start_date + timedelta(days=30)
-    
-    # Filtra medici
-    query = db.query(models.Doctor)
-    if doctor_id:
-        query = query.filter(models.Doctor.id == doctor_id)
-    elif specializzazione:
-        query = query.filter(models.Doctor.specializzazione == specializzazione)
-    
-    doctors = query.all()
-    
+    return start_date, end_date
+
+def available_slots_response(doctors, schedules, busy_by_doctor, start_date: date, end_date: date) -> dict:
     all_slots = []
     for doctor in doctors:
-        # Ottieni appuntamenti esistenti
-        appointments = db.query(models.Appointment).filter(
-            models.Appointment.doctor_id == doctor.id,
-            models.Appointment.data_appuntamento >= start_date,
-            models.Appointment.data_appuntamento <= end_date,
-            models.Appointment.stato != 'cancellato'
-        ).all()
-        
-        busy_slots = {}
-        for apt in appointments:
-            key = f"{apt.data_appuntamento}_{apt.ora_inizio}"
-            busy_slots[key] = True
+        schedule = schedules[doctor.id]
+        busy_by_day = busy_by_doctor[doctor.id]
+        nome_medico = f"{doctor.nome} {doctor.cognome}"
         
         # Genera slot disponibili
-        giorni_map = {
-            'lun': 0, 'mar': 1, 'mer': 2, 'gio': 3, 'ven': 4, 'sab': 5, 'dom': 6
-        }
-        giorni_disponibili = [giorni_map[g] for g in doctor.giorni_disponibili.split(',')]
-        
-        current_date = start_date
-        while current_date <= end_date:
-            if current_date.weekday() in giorni_disponibili:
-                ora_corrente = datetime.combine(date.today(), doctor.orario_inizio)
-                ora_fine = datetime.combine(date.today(), doctor.orario_fine)
-                
-                while ora_corrente < ora_fine:
-                    slot_key = f"{current_date}_{ora_corrente.time()}"
-                    if slot_key not in busy_slots:
-                        all_slots.append({
-                            "data": str(current_date),
-                            "ora": str(ora_corrente.time()),
-                            "doctor_id": doctor.id,
-                            "nome_medico": f"{doctor.nome} {doctor.cognome}",
-                            "specializzazione": doctor.specializzazione
-                        })
-                    ora_corrente += timedelta(minutes=30)
-            
-            current_date += timedelta(days=1)
+        for giorno, orari in iter_free_slots(schedule, start_date, end_date, busy_by_day):
+            for ora in orari:
+                all_slots.append({
+                    "data": giorno,
+                    "ora": ora,
+                    "doctor_id": doctor.id,
+                    "nome_medico": nome_medico,
+                    "specializzazione": doctor.specializzazione
+                })
     
     return {"available_slots": all_slots, "total": len(all_slots)}
 
-@router.get("/waiting-list")
-def get_waiting_list(db: Session = Depends(get_db)):
-    """Ottieni lista d'attesa"""
-    waiting = db.query(models.WaitingList).order_by(
-        models.WaitingList.priorita.desc(),
-        models.WaitingList.data_richiesta
-    ).all()
-    
-    result = []
-    for item in waiting:
-        patient = db.query(models.Patient).filter(models.Patient.id == item.patient_id).first()
-        doctor = None
-        if item.doctor_id:
-            doctor = db.query(models.Doctor).filter(models.Doctor.id == item.doctor_id).first()
-        
-        result.append({
-            "id": item.id,
-            "paziente": f"{patient.nome} {patient.cognome}",
-            "telefono": patient.telefono,
-            "tipo_visita": item.tipo_visita,
-            "specializzazione": item.specializzazione,
-            "medico": f"{doctor.nome} {doctor.cognome}" if doctor else None,
-            "priorita": item.priorita,
-            "data_richiesta": str(item.data_richiesta),
-            "note": item.note
+def available_slots_compact_response(doctors, schedules, busy_by_doctor, start_date: date, end_date: date) -> dict:
+    """Slot liberi raggruppati per medico e giorno.
+
+    Per ogni giorno c'è la bitmask degli slot liberi: il bit i indica lo slot
+    che inizia a ora_inizio + i * slot_minuti. I dati del medico compaiono una volta.
+    """
+    entries = []
+    total = 0
+    for doctor in doctors:
+        schedule = schedules[doctor.id]
+        giorni = dict(iter_free_masks(schedule, start_date, end_date, busy_by_doctor[doctor.id]))
+        if not giorni:
+            continue
+        total += sum(bin(mask).count("1") for mask in giorni.values())
+        entries.append({
+            "doctor_id": doctor.id,
+            "nome_medico": f"{doctor.nome} {doctor.cognome}",
+            "specializzazione": doctor.specializzazione,
+            "ora_inizio": schedule.slot_labels[0],
+            "giorni": giorni
         })
     
-    return result
+    return {"format": "compact", "slot_minuti": SLOT_MINUTES, "doctors": entries, "total": total}
+
+def slots_response(format: str, doctors, schedules, busy_by_doctor, start_date: date, end_date: date):
+    if format == "compact":
+        content = available_slots_compact_response(doctors, schedules, busy_by_doctor, start_date, end_date)
+    else:
+        content = available_slots_response(doctors, schedules, busy_by_doctor, start_date, end_date)
+    return FastJSONResponse(content)
+
+def check_slot_format(format: str) -> None:
+    if format not in SLOT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato non supportato: usare full o compact")
+
+@router.get("/", response_model=List[schemas.Appointment])
+def get_appointments(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    data_from: Optional[date] = None,
+    data_to: Optional[date] = None,
+    stato: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Ottieni lista appuntamenti con filtri - Solo i propri appuntamenti per i pazienti"""
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+    stmt = appointments_list_statement(
+        current_user, doctor_id, patient_id, data_from, data_to, stato, cursor, skip, limit
+    )
+    return appointments_page_response(db.execute(stmt).all(), limit)
+
+@router.get("/detailed")
+def get_appointments_detailed(
+    response: Response,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    data: Optional[date] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Ottieni appuntamenti con dettagli completi - Autenticazione richiesta"""
+    stmt = detailed_statement(current_user, doctor_id, patient_id, data, cursor)
+    limit = detailed_page_limit(limit, cursor)
+    if limit is None:
+        return [detailed_entry(*row) for row in db.execute(stmt).all()]
+    
+    rows = db.execute(stmt.limit(limit + 1)).all()
+    rows, next_cursor = split_page(rows, limit, key=lambda row: appointment_sort_key(row[0]))
+    set_next_cursor(response, next_cursor)
+    return [detailed_entry(*row) for row in rows]
+
+@router.get("/available-slots")
+def get_available_slots(
+    specializzazione: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    start_date: date = None,
+    end_date: date = None,
+    format: str = "full",
+    db: Session = Depends(get_read_db)
+):
+    """Ottieni slot disponibili per specializzazione o medico (format=compact: bitmask per medico e giorno)"""
+    check_slot_format(format)
+    start_date, end_date = slot_date_range(start_date, end_date)
+    doctors = db.execute(slot_doctors_statement(specializzazione, doctor_id)).all()
+    
+    # Giornate occupate dalla cache; le mancanti con un'unica query
+    schedules = {doctor.id: DoctorSchedule.from_doctor(doctor) for doctor in doctors}
+    busy_by_doctor = load_busy_masks(db, schedules, start_date, end_date)
+    
+    return slots_response(format, doctors, schedules, busy_by_doctor, start_date, end_date)
+
+@router.get("/waiting-list")
+def get_waiting_list(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    specializzazione: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Ottieni lista d'attesa ordinata per priorità clinica e data di richiesta"""
+    query = db.query(
+        models.WaitingList.id,
+        models.WaitingList.tipo_visita,
+        models.WaitingList.specializzazione,
+        models.WaitingList.priorita,
+        models.WaitingList.priorita_rank,
+        models.WaitingList.data_richiesta,
+        models.WaitingList.note,
+        models.Patient.nome.label("paziente_nome"),
+        models.Patient.cognome.label("paziente_cognome"),
+        models.Patient.telefono,
+        models.Doctor.nome.label("medico_nome"),
+        models.Doctor.cognome.label("medico_cognome")
+    ).join(
+        models.Patient, models.WaitingList.patient_id == models.Patient.id
+    ).outerjoin(
+        models.Doctor, models.WaitingList.doctor_id == models.Doctor.id
+    )
+    
+    if specializzazione:
+        query = query.filter(models.WaitingList.specializzazione == specializzazione)
+    if doctor_id:
+        query = query.filter(models.WaitingList.doctor_id == doctor_id)
+    
+    # Ordinamento (rango desc, data_richiesta, id) servito da ix_waiting_list_*_coda
+    sort_columns = (
+        models.WaitingList.priorita_rank,
+        models.WaitingList.data_richiesta,
+        models.WaitingList.id
+    )
+    sort_descending = (True, False, False)
+    if cursor:
+        values = decode_cursor(cursor, (int, datetime.fromisoformat, int))
+        query = query.filter(keyset_filter(sort_columns, values, sort_descending))
+    
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+    rows = query.order_by(
+        *(column.desc() if desc else column for column, desc in zip(sort_columns, sort_descending))
+    ).limit(limit + 1).all()
+    rows, next_cursor = split_page(
+        rows, limit, key=lambda row: (row.priorita_rank, row.data_richiesta, row.id)
+    )
+    set_next_cursor(response, next_cursor)
+    
+    return [
+        {
+            "id": row.id,
+            "paziente": f"{row.paziente_nome} {row.paziente_cognome}",
+            "telefono": row.telefono,
+            "tipo_visita": row.tipo_visita,
+            "specializzazione": row.specializzazione,
+            "medico": f"{row.medico_nome} {row.medico_cognome}" if row.medico_nome else None,
+            "priorita": row.priorita,
+            "data_richiesta": str(row.data_richiesta),
+            "note": row.note
+        }
+        for row in rows
+    ]
+
+@router.get("/export")
+def export_appointments(
+    request: Request,
+    format: str = "ndjson",
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    data_from: Optional[date] = None,
+    data_to: Optional[date] = None,
+    stato: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """Esporta gli appuntamenti con dettagli in streaming (NDJSON o CSV)"""
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Formato non supportato: usare ndjson o csv")
+    if data_from and data_to and data_from > data_to:
+        raise HTTPException(status_code=400, detail="data_from deve precedere data_to")
+    
+    stmt = export_statement(current_user, doctor_id, patient_id, data_from, data_to, stato)
+    filename = f"appuntamenti_{data_from or 'inizio'}_{data_to or 'fine'}.{format}"
+    # Stessa scelta primario/replica di get_read_db: chi ha appena scritto legge dal primario
+    batches = iter_batches(read_session_factory(request), stmt, export_entry)
+    return StreamingResponse(
+        export_chunks(format, batches, EXPORT_COLUMNS),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/availability/stream")
+async def stream_availability(
+    request: Request,
+    specializzazione: Optional[str] = None,
+    doctor_id: Optional[int] = None
+):
+    """Aggiornamenti della disponibilità in push (Server-Sent Events).
+
+    Ogni evento "availability" contiene la bitmask degli slot liberi di una
+    giornata (come in available-slots?format=compact); "resync" chiede di
+    ricaricare lo snapshot.
+    """
+    return StreamingResponse(
+        availability_events(doctor_id, specializzazione, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/{appointment_id}", response_model=schemas.Appointment)
 def get_appointment(
     appointment_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Ottieni un singolo appuntamento per ID"""
     db_appointment = db.query(models.Appointment).filter(
@@ -229,11 +516,48 @@ def get_appointment(
     
     return db_appointment
 
+def check_booking_conflicts(
+    db: Session,
+    doctor_id: int,
+    room_id: Optional[int],
+    giorno: date,
+    ora_inizio: time,
+    durata_minuti: int,
+    exclude_id: Optional[int] = None
+) -> None:
+    """Sovrapposizioni di intervallo per medico e sala (409), una query per risorsa"""
+    if find_conflict(db, models.Appointment.doctor_id, doctor_id, giorno, ora_inizio, durata_minuti, exclude_id):
+        raise HTTPException(status_code=409, detail="Orario non disponibile per questo medico")
+    
+    # Verifica disponibilità sala se specificata
+    if room_id:
+        room = db.query(models.Room).filter(models.Room.id == room_id).first()
+        if not room or not room.attiva:
+            raise HTTPException(status_code=404, detail="Sala non disponibile")
+        if find_conflict(db, models.Appointment.room_id, room_id, giorno, ora_inizio, durata_minuti, exclude_id):
+            raise HTTPException(status_code=409, detail="Sala non disponibile in questo orario")
+
+@contextmanager
+def slot_conflict_guard(db: Session) -> Iterator[None]:
+    """Scritture dell'occupazione: la chiave di appointment_slots respinge le sovrapposizioni concorrenti"""
+    try:
+        yield
+    except IntegrityError as error:
+        db.rollback()
+        if is_slot_conflict(error):
+            raise HTTPException(status_code=409, detail="Orario appena occupato da un'altra prenotazione")
+        raise
+
+def commit_booking(db: Session) -> None:
+    """Commit di una prenotazione (gli insert ORM dell'occupazione partono al flush del commit)"""
+    with slot_conflict_guard(db):
+        db.commit()
+
 @router.post("/", response_model=schemas.Appointment)
 def create_appointment(
     appointment: schemas.AppointmentCreate,
     current_user = Depends(get_current_patient),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """Crea un nuovo appuntamento - Solo pazienti autenticati"""
     # Forza il patient_id dell'utente loggato
@@ -248,57 +572,156 @@ def create_appointment(
     if not doctor:
         raise HTTPException(status_code=404, detail="Medico non trovato")
     
-    # Verifica disponibilità medico (no appuntamenti sovrapposti)
-    ora_fine = (datetime.combine(date.today(), appointment.ora_inizio) + 
-                timedelta(minutes=appointment.durata_minuti)).time()
-    
-    conflicting = db.query(models.Appointment).filter(
-        models.Appointment.doctor_id == appointment.doctor_id,
-        models.Appointment.data_appuntamento == appointment.data_appuntamento,
-        models.Appointment.stato != 'cancellato',
-        or_(
-            and_(
-                models.Appointment.ora_inizio <= appointment.ora_inizio,
-                models.Appointment.ora_inizio > appointment.ora_inizio
-            ),
-            and_(
-                models.Appointment.ora_inizio < ora_fine,
-                models.Appointment.ora_inizio >= appointment.ora_inizio
-            )
-        )
-    ).first()
-    
-    if conflicting:
-        raise HTTPException(status_code=409, detail="Orario non disponibile per questo medico")
-    
-    # Verifica disponibilità sala se specificata
-    if appointment.room_id:
-        room = db.query(models.Room).filter(models.Room.id == appointment.room_id).first()
-        if not room or not room.attiva:
-            raise HTTPException(status_code=404, detail="Sala non disponibile")
-        
-        room_conflict = db.query(models.Appointment).filter(
-            models.Appointment.room_id == appointment.room_id,
-            models.Appointment.data_appuntamento == appointment.data_appuntamento,
-            models.Appointment.stato != 'cancellato',
-            models.Appointment.ora_inizio == appointment.ora_inizio
-        ).first()
-        
-        if room_conflict:
-            raise HTTPException(status_code=409, detail="Sala non disponibile in questo orario")
+    check_booking_conflicts(
+        db,
+        appointment.doctor_id,
+        appointment.room_id,
+        appointment.data_appuntamento,
+        appointment.ora_inizio,
+        appointment.durata_minuti
+    )
     
     # Crea appuntamento
     db_appointment = models.Appointment(**appointment.dict())
     db.add(db_appointment)
-    db.commit()
+    commit_booking(db)
+    invalidate_doctor_days((db_appointment.doctor_id, db_appointment.data_appuntamento))
+    publish_availability(db, (db_appointment.doctor_id, db_appointment.data_appuntamento))
     db.refresh(db_appointment)
     return db_appointment
 
+def bulk_item_error(item: schemas.AppointmentCreate, current_user, doctors, patients, rooms):
+    """Controlli di un elemento del lotto che non dipendono dagli orari"""
+    if current_user.user_type == "patient" and item.patient_id != current_user.id:
+        return 403, "Puoi prenotare appuntamenti solo per te stesso"
+    if item.doctor_id not in doctors:
+        return 404, "Medico non trovato"
+    if item.patient_id not in patients:
+        return 404, "Paziente non trovato"
+    if item.room_id and item.room_id not in rooms:
+        return 404, "Sala non disponibile"
+    return None
+
+@router.post("/bulk", response_model=schemas.AppointmentBulkResponse)
+def create_appointments_bulk(
+    payload: schemas.AppointmentBulkCreate,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
+):
+    """Crea più appuntamenti in un'unica transazione con esito per elemento.
+
+    Medici, pazienti, sale e intervalli occupati vengono letti con una query
+    per tipo; i conflitti si controllano in memoria, compresi quelli tra
+    elementi dello stesso lotto (vince il primo nell'ordine della richiesta).
+    """
+    items = payload.appointments
+    if len(items) > MAX_BULK_APPOINTMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Massimo {MAX_BULK_APPOINTMENTS} appuntamenti per richiesta"
+        )
+    if not items:
+        return {"creati": 0, "rifiutati": 0, "risultati": []}
+    
+    doctors = set(db.scalars(
+        select(models.Doctor.id).where(models.Doctor.id.in_({item.doctor_id for item in items}))
+    ))
+    patients = set(db.scalars(
+        select(models.Patient.id).where(models.Patient.id.in_({item.patient_id for item in items}))
+    ))
+    room_ids = {item.room_id for item in items if item.room_id}
+    rooms = set(db.scalars(
+        select(models.Room.id).where(models.Room.id.in_(room_ids), models.Room.attiva == True)
+    )) if room_ids else set()
+    
+    doctor_busy = load_interval_index(
+        db, models.Appointment.doctor_id,
+        {(item.doctor_id, item.data_appuntamento) for item in items if item.doctor_id in doctors}
+    )
+    room_busy = load_interval_index(
+        db, models.Appointment.room_id,
+        {(item.room_id, item.data_appuntamento) for item in items if item.room_id in rooms}
+    )
+    
+    results = []
+    accepted = []
+    for index, item in enumerate(items):
+        error = bulk_item_error(item, current_user, doctors, patients, rooms)
+        interval = appointment_interval(item.ora_inizio, item.durata_minuti)
+        doctor_day = (item.doctor_id, item.data_appuntamento)
+        room_day = (item.room_id, item.data_appuntamento)
+        if not error and doctor_busy.conflicts(doctor_day, interval):
+            error = 409, "Orario non disponibile per questo medico"
+        if not error and item.room_id and room_busy.conflicts(room_day, interval):
+            error = 409, "Sala non disponibile in questo orario"
+        
+        if error:
+            results.append({"indice": index, "esito": "rifiutato", "status_code": error[0], "detail": error[1]})
+            continue
+        
+        # Gli elementi accettati occupano l'orario per quelli successivi del lotto
+        doctor_busy.add(doctor_day, interval)
+        if item.room_id:
+            room_busy.add(room_day, interval)
+        result = {"indice": index, "esito": "creato", "status_code": 201}
+        results.append(result)
+        accepted.append((item, result))
+    
+    rejected = len(results) - len(accepted)
+    if payload.atomico and rejected:
+        for _, result in accepted:
+            result.update(esito="annullato", status_code=409, detail="Lotto annullato: altri elementi rifiutati")
+        return {"creati": 0, "rifiutati": rejected, "risultati": results}
+    
+    if accepted:
+        # Un solo insert executemany; gli id si rileggono dalla chiave (medico, data, ora),
+        # univoca tra gli appuntamenti attivi dopo il controllo dei conflitti
+        db.execute(insert(models.Appointment).execution_options(render_nulls=True), [
+            {**item.dict(), "stato": "programmato"} for item, _ in accepted
+        ])
+        days = [item.data_appuntamento for item, _ in accepted]
+        created_ids = {
+            (row.doctor_id, row.data_appuntamento, row.ora_inizio): row.id
+            for row in db.execute(
+                select(
+                    models.Appointment.id,
+                    models.Appointment.doctor_id,
+                    models.Appointment.data_appuntamento,
+                    models.Appointment.ora_inizio
+                ).where(
+                    models.Appointment.doctor_id.in_({item.doctor_id for item, _ in accepted}),
+                    models.Appointment.data_appuntamento >= min(days),
+                    models.Appointment.data_appuntamento <= max(days),
+                    models.Appointment.stato != 'cancellato'
+                )
+            )
+        }
+        for item, result in accepted:
+            result["appointment_id"] = created_ids.get((item.doctor_id, item.data_appuntamento, item.ora_inizio))
+        # Gli insert Core non passano dagli eventi ORM: l'occupazione si scrive qui.
+        # Una prenotazione concorrente confermata dopo la lettura degli intervalli
+        # fa fallire l'insert (o il commit): il lotto viene annullato con 409
+        with slot_conflict_guard(db):
+            db.execute(insert(models.AppointmentSlot), [
+                row
+                for item, result in accepted
+                for row in slot_rows(
+                    result["appointment_id"], item.doctor_id, item.room_id,
+                    item.data_appuntamento, item.ora_inizio, item.durata_minuti
+                )
+            ])
+            db.commit()
+        booked_days = {(item.doctor_id, item.data_appuntamento) for item, _ in accepted}
+        invalidate_doctor_days(*booked_days)
+        publish_availability(db, *booked_days)
+    
+    return {"creati": len(accepted), "rifiutati": rejected, "risultati": results}
+
 @router.put("/{appointment_id}", response_model=schemas.Appointment)
 def update_appointment(
     appointment_id: int,
     appointment_update: schemas.AppointmentUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """Modifica un appuntamento esistente con preavviso minimo"""
     db_appointment = db.query(models.Appointment).filter(
@@ -324,11 +747,29 @@ def update_appointment(
             detail=f"È necessario un preavviso di almeno {MINIMUM_NOTICE_HOURS} ore"
         )
     
+    old_day = (db_appointment.doctor_id, db_appointment.data_appuntamento)
+    changes = appointment_update.dict(exclude_unset=True)
+    
+    # Lo spostamento deve rispettare gli stessi vincoli della creazione
+    if {'data_appuntamento', 'ora_inizio', 'room_id'} & changes.keys():
+        check_booking_conflicts(
+            db,
+            db_appointment.doctor_id,
+            changes.get('room_id', db_appointment.room_id),
+            changes.get('data_appuntamento') or db_appointment.data_appuntamento,
+            changes.get('ora_inizio') or db_appointment.ora_inizio,
+            db_appointment.durata_minuti,
+            exclude_id=db_appointment.id
+        )
+    
     # Aggiorna campi
-    for key, value in appointment_update.dict(exclude_unset=True).items():
+    for key, value in changes.items():
         setattr(db_appointment, key, value)
     
-    db.commit()
+    new_day = (db_appointment.doctor_id, db_appointment.data_appuntamento)
+    commit_booking(db)
+    invalidate_doctor_days(old_day, new_day)
+    publish_availability(db, old_day, new_day)
     db.refresh(db_appointment)
     return db_appointment
 
@@ -337,7 +778,7 @@ def cancel_appointment(
     appointment_id: int,
     motivo: Optional[str] = None,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """Cancella un appuntamento - Paziente può cancellare i propri, medico i propri"""
     db_appointment = db.query(models.Appointment).filter(
@@ -374,5 +815,7 @@ def cancel_appointment(
     db_appointment.stato = 'cancellato'
     db_appointment.motivo_cancellazione = motivo
     db.commit()
+    invalidate_doctor_days((db_appointment.doctor_id, db_appointment.data_appuntamento))
+    publish_availability(db, (db_appointment.doctor_id, db_appointment.data_appuntamento))
     
     return {"message": "Appuntamento cancellato con successo"}
\ No newline at end of file
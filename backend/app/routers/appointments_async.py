@@ -0,0 +1,92 @@
+"""Varianti asincrone delle letture più frequenti sugli appuntamenti.
+
+Registrate da main.py prima del router sincrono quando DATABASE_MODE=async:
+stessi path, stessi parametri e stesse risposte, ma la query gira su una
+AsyncSession senza occupare un thread del pool.
+"""
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date
+from backend.app.schemas import appointment as schemas
+from backend.database import get_async_read_db
+from backend.app.auth.auth_service import get_current_user
+from backend.app.services.scheduling import DoctorSchedule
+from backend.app.services.availability import load_busy_masks_async
+from backend.app.services.pagination import set_next_cursor, split_page
+from backend.app.routers.appointments import (
+    MAX_PAGE_LIMIT,
+    appointment_sort_key,
+    appointments_list_statement,
+    appointments_page_response,
+    check_slot_format,
+    detailed_entry,
+    detailed_page_limit,
+    detailed_statement,
+    slot_date_range,
+    slot_doctors_statement,
+    slots_response,
+)
+
+router = APIRouter()
+
+@router.get("/", response_model=List[schemas.Appointment])
+async def get_appointments(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    data_from: Optional[date] = None,
+    data_to: Optional[date] = None,
+    stato: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Ottieni lista appuntamenti con filtri - Solo i propri appuntamenti per i pazienti"""
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+    stmt = appointments_list_statement(
+        current_user, doctor_id, patient_id, data_from, data_to, stato, cursor, skip, limit
+    )
+    return appointments_page_response((await db.execute(stmt)).all(), limit)
+
+@router.get("/detailed")
+async def get_appointments_detailed(
+    response: Response,
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    data: Optional[date] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Ottieni appuntamenti con dettagli completi - Autenticazione richiesta"""
+    stmt = detailed_statement(current_user, doctor_id, patient_id, data, cursor)
+    limit = detailed_page_limit(limit, cursor)
+    if limit is None:
+        return [detailed_entry(*row) for row in (await db.execute(stmt)).all()]
+    
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    rows, next_cursor = split_page(rows, limit, key=lambda row: appointment_sort_key(row[0]))
+    set_next_cursor(response, next_cursor)
+    return [detailed_entry(*row) for row in rows]
+
+@router.get("/available-slots")
+async def get_available_slots(
+    specializzazione: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    start_date: date = None,
+    end_date: date = None,
+    format: str = "full",
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Ottieni slot disponibili per specializzazione o medico (format=compact: bitmask per medico e giorno)"""
+    check_slot_format(format)
+    start_date, end_date = slot_date_range(start_date, end_date)
+    doctors = (await db.execute(slot_doctors_statement(specializzazione, doctor_id))).all()
+    
+    schedules = {doctor.id: DoctorSchedule.from_doctor(doctor) for doctor in doctors}
+    busy_by_doctor = await load_busy_masks_async(db, schedules, start_date, end_date)
+    
+    return slots_response(format, doctors, schedules, busy_by_doctor, start_date, end_date)
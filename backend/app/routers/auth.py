@@ -6,12 +6,14 @@ from backend.app.schemas.doctor import Doctor, DoctorCreate
 from backend.app.schemas.auth import Token
 from backend.app.schemas.auth import UserLogin
 from backend.app.schemas.patient import Patient, PatientCreate
-from backend.database import get_db
+from backend.database import get_db, get_write_db
+from backend.app.services.reference_cache import invalidate_reference
 from backend.app.auth.auth_service import (
     authenticate_patient,
     authenticate_doctor,
     create_access_token,
-    get_password_hash,
+    hash_password_in_pool,
+    run_in_password_pool,
     get_current_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
@@ -20,9 +22,9 @@ router = APIRouter()
 
 
 @router.post("/login/patient", response_model=Token)
-def login_patient(user_login: UserLogin, db: Session = Depends(get_db)):
+async def login_patient(user_login: UserLogin, db: Session = Depends(get_db)):
     """Login per pazienti"""
-    patient = authenticate_patient(db, user_login.email, user_login.password)
+    patient = await run_in_password_pool(authenticate_patient, db, user_login.email, user_login.password)
     
     if not patient:
         raise HTTPException(
@@ -47,9 +49,9 @@ def login_patient(user_login: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.post("/login/doctor", response_model=Token)
-def login_doctor(user_login: UserLogin, db: Session = Depends(get_db)):
+async def login_doctor(user_login: UserLogin, db: Session = Depends(get_db)):
     """Login per medici"""
-    doctor = authenticate_doctor(db, user_login.email, user_login.password)
+    doctor = await run_in_password_pool(authenticate_doctor, db, user_login.email, user_login.password)
     
     if not doctor:
         raise HTTPException(
@@ -74,7 +76,7 @@ def login_doctor(user_login: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.post("/register/patient", response_model=Patient)
-def register_patient(patient_data: PatientCreate, db: Session = Depends(get_db)):
+def register_patient(patient_data: PatientCreate, db: Session = Depends(get_write_db)):
     """Registrazione nuovo paziente"""
     # Verifica se email esiste già
     existing = db.query(models.Patient).filter(
@@ -99,7 +101,7 @@ def register_patient(patient_data: PatientCreate, db: Session = Depends(get_db))
     # Crea paziente
     patient_dict = patient_data.dict()
     password = patient_dict.pop('password')
-    patient_dict['password_hash'] = get_password_hash(password)
+    patient_dict['password_hash'] = hash_password_in_pool(password)
     
     db_patient = models.Patient(**patient_dict)
     db.add(db_patient)
@@ -109,7 +111,7 @@ def register_patient(patient_data: PatientCreate, db: Session = Depends(get_db))
     return db_patient
 
 @router.post("/register/doctor", response_model=Doctor)
-def register_doctor(doctor_data: DoctorCreate, db: Session = Depends(get_db)):
+def register_doctor(doctor_data: DoctorCreate, db: Session = Depends(get_write_db)):
     """Registrazione nuovo medico"""
     # Verifica se email esiste già
     existing = db.query(models.Doctor).filter(
@@ -124,11 +126,12 @@ def register_doctor(doctor_data: DoctorCreate, db: Session = Depends(get_db)):
     # Crea medico
     doctor_dict = doctor_data.dict()
     password = doctor_dict.pop('password')
-    doctor_dict['password_hash'] = get_password_hash(password)
+    doctor_dict['password_hash'] = hash_password_in_pool(password)
     
     db_doctor = models.Doctor(**doctor_dict)
     db.add(db_doctor)
     db.commit()
+    invalidate_reference("doctors")
     db.refresh(db_doctor)
     
     return db_doctor
@@ -1,45 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date
 from backend.app import models
 from backend.app.schemas import patient as schemas
-from backend.database import get_db
+from backend.database import get_read_db, get_write_db
 from backend.app.auth.auth_service import get_current_doctor, get_current_patient, get_current_user
+from backend.app.services.patient_search import search_statement, search_terms
+from backend.app.services.pagination import DATE_TIME_ID, decode_cursor, keyset_filter, set_next_cursor, split_page
+from backend.app.services.serialization import FastJSONResponse, RowSerializer
 
 router = APIRouter()
 
+MAX_HISTORY_LIMIT = 500
+
+# Lista pazienti: solo le colonne dello schema, serializzate senza rivalidazione
+PATIENT_SERIALIZER = RowSerializer(schemas.Patient)
+
 @router.get("/", response_model=List[schemas.Patient])
 def get_patients(
     skip: int = 0,
     limit: int = 100,
     search: str = None,
     current_user = Depends(get_current_doctor),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Ottieni lista pazienti - Solo per medici"""
-    query = db.query(models.Patient)
-    
+    """Ottieni lista pazienti - Solo per medici. La ricerca è per prefisso su nome, cognome e codice fiscale"""
     if search:
-        search_filter = f"%{search}%"
-        query = query.filter(
-            (models.Patient.nome.like(search_filter)) |
-            (models.Patient.cognome.like(search_filter)) |
-            (models.Patient.codice_fiscale.like(search_filter))
-        )
-    
-    patients = query.offset(skip).limit(limit).all()
-    return patients
+        terms = search_terms(search)
+        if not terms:
+            return []
+        stmt = search_statement(terms)
+    else:
+        stmt = select(models.Patient)
+    
+    columns = PATIENT_SERIALIZER.columns(models.Patient)
+    rows = db.execute(stmt.with_only_columns(*columns).offset(skip).limit(limit)).all()
+    return FastJSONResponse(PATIENT_SERIALIZER.many(rows))
 
 @router.get("/me", response_model=schemas.Patient)
-def get_my_profile(current_user = Depends(get_current_patient), db: Session = Depends(get_db)):
+def get_my_profile(current_user = Depends(get_current_patient), db: Session = Depends(get_read_db)):
     """Ottieni il proprio profilo - Solo pazienti"""
-    return current_user
+    patient = db.query(models.Patient).filter(models.Patient.id == current_user.id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Paziente non trovato")
+    return patient
 
 @router.get("/{patient_id}", response_model=schemas.Patient)
 def get_patient(
     patient_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Ottieni dettagli paziente - Medici vedono tutti, pazienti solo se stessi"""
     patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
@@ -53,41 +65,80 @@ def get_patient(
     
     return patient
 
-@router.get("/{patient_id}/history")
-def get_patient_history(
-    patient_id: int,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Ottieni storico visite - Medici vedono tutto, pazienti solo proprie"""
-    patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
-    if not patient:
-        raise HTTPException(status_code=404, detail="Paziente non trovato")
-    
-    # Verifica permessi
+HISTORY_SORT = (
+    models.Appointment.data_appuntamento,
+    models.Appointment.ora_inizio,
+    models.Appointment.id
+)
+
+def history_patient_statement(patient_id: int):
+    return select(
+        models.Patient.id,
+        models.Patient.nome,
+        models.Patient.cognome,
+        models.Patient.codice_fiscale
+    ).where(models.Patient.id == patient_id)
+
+def check_history_access(current_user, patient_id: int):
     if hasattr(current_user, 'user_type') and current_user.user_type == "patient":
         if patient_id != current_user.id:
             raise HTTPException(status_code=403, detail="Non puoi accedere allo storico di altri pazienti")
+
+def history_statements(
+    patient_id: int,
+    limit: int,
+    cursor: Optional[str],
+    data_from: Optional[date],
+    data_to: Optional[date]
+):
+    """Query (pagina, totale) dello storico: appuntamenti e medico in un'unica join"""
+    stmt = select(
+        models.Appointment.id,
+        models.Appointment.data_appuntamento,
+        models.Appointment.ora_inizio,
+        models.Appointment.tipo_visita,
+        models.Appointment.stato,
+        models.Appointment.note,
+        models.Doctor.nome,
+        models.Doctor.cognome,
+        models.Doctor.specializzazione
+    ).join(
+        models.Doctor, models.Appointment.doctor_id == models.Doctor.id
+    ).where(models.Appointment.patient_id == patient_id)
+    
+    if data_from:
+        stmt = stmt.where(models.Appointment.data_appuntamento >= data_from)
+    if data_to:
+        stmt = stmt.where(models.Appointment.data_appuntamento <= data_to)
     
-    # Ottieni tutti gli appuntamenti del paziente
-    appointments = db.query(models.Appointment).filter(
-        models.Appointment.patient_id == patient_id
-    ).order_by(models.Appointment.data_appuntamento.desc()).all()
-    
-    # Arricchisci con dati medico
-    history = []
-    for apt in appointments:
-        doctor = db.query(models.Doctor).filter(models.Doctor.id == apt.doctor_id).first()
-        history.append({
-            "id": apt.id,
-            "data": str(apt.data_appuntamento),
-            "ora": str(apt.ora_inizio),
-            "tipo_visita": apt.tipo_visita,
-            "stato": apt.stato,
-            "medico": f"{doctor.nome} {doctor.cognome}",
-            "specializzazione": doctor.specializzazione,
-            "note": apt.note
-        })
+    # Totale visite nel periodo richiesto (indipendente dalla pagina)
+    count_stmt = stmt.with_only_columns(func.count(models.Appointment.id))
+    
+    if cursor:
+        stmt = stmt.where(keyset_filter(HISTORY_SORT, decode_cursor(cursor, DATE_TIME_ID)))
+    page_stmt = stmt.order_by(*(column.desc() for column in HISTORY_SORT)).limit(limit + 1)
+    
+    return page_stmt, count_stmt
+
+def history_response(response: Response, patient, rows, total_visits: int, limit: int) -> dict:
+    rows, next_cursor = split_page(
+        rows, limit, key=lambda row: (row.data_appuntamento, row.ora_inizio, row.id)
+    )
+    set_next_cursor(response, next_cursor)
+    
+    history = [
+        {
+            "id": row.id,
+            "data": str(row.data_appuntamento),
+            "ora": str(row.ora_inizio),
+            "tipo_visita": row.tipo_visita,
+            "stato": row.stato,
+            "medico": f"{row.nome} {row.cognome}",
+            "specializzazione": row.specializzazione,
+            "note": row.note
+        }
+        for row in rows
+    ]
     
     return {
         "patient": {
@@ -96,11 +147,37 @@ def get_patient_history(
             "codice_fiscale": patient.codice_fiscale
         },
         "history": history,
-        "total_visits": len(history)
+        "total_visits": total_visits
     }
 
+@router.get("/{patient_id}/history")
+def get_patient_history(
+    patient_id: int,
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    data_from: Optional[date] = None,
+    data_to: Optional[date] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Ottieni storico visite - Medici vedono tutto, pazienti solo proprie"""
+    patient = db.execute(history_patient_statement(patient_id)).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Paziente non trovato")
+    
+    # Verifica permessi
+    check_history_access(current_user, patient_id)
+    
+    limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+    page_stmt, count_stmt = history_statements(patient_id, limit, cursor, data_from, data_to)
+    
+    total_visits = db.scalar(count_stmt)
+    rows = db.execute(page_stmt).all()
+    return history_response(response, patient, rows, total_visits, limit)
+
 @router.post("/", response_model=schemas.Patient)
-def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_db)):
+def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_write_db)):
     """Crea un nuovo paziente - Endpoint pubblico per registrazione"""
     # Verifica se codice fiscale già esiste
     existing = db.query(models.Patient).filter(
@@ -127,7 +204,7 @@ def update_patient(
     patient_id: int,
     patient: schemas.PatientCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """Aggiorna dati paziente - Solo se stesso o medico"""
     db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
@@ -0,0 +1,42 @@
+"""Variante asincrona dello storico visite (vedi appointments_async)."""
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date
+from backend.database import get_async_read_db
+from backend.app.auth.auth_service import get_current_user
+from backend.app.routers.patients import (
+    MAX_HISTORY_LIMIT,
+    check_history_access,
+    history_patient_statement,
+    history_response,
+    history_statements,
+)
+
+router = APIRouter()
+
+@router.get("/{patient_id}/history")
+async def get_patient_history(
+    patient_id: int,
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    data_from: Optional[date] = None,
+    data_to: Optional[date] = None,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Ottieni storico visite - Medici vedono tutto, pazienti solo proprie"""
+    patient = (await db.execute(history_patient_statement(patient_id))).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Paziente non trovato")
+    
+    # Verifica permessi
+    check_history_access(current_user, patient_id)
+    
+    limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+    page_stmt, count_stmt = history_statements(patient_id, limit, cursor, data_from, data_to)
+    
+    total_visits = await db.scalar(count_stmt)
+    rows = (await db.execute(page_stmt)).all()
+    return history_response(response, patient, rows, total_visits, limit)
@@ -1,31 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
 from backend.app import models
 from backend.app.schemas import room as schemas
-from backend.database import get_db
+from backend.database import get_read_db, is_replica
+from backend.app.services.reference_cache import cached_reference_response
 
 router = APIRouter()
 
+room_list_adapter = TypeAdapter(List[schemas.Room])
+
+def _room_day_rows(db: Session, data: date, room_ids: List[int]):
+    """Appuntamenti del giorno per le sale indicate, con medico e paziente in un'unica query"""
+    return db.query(
+        models.Appointment.id,
+        models.Appointment.room_id,
+        models.Appointment.ora_inizio,
+        models.Appointment.durata_minuti,
+        models.Appointment.tipo_visita,
+        models.Doctor.nome.label("medico_nome"),
+        models.Doctor.cognome.label("medico_cognome"),
+        models.Patient.nome.label("paziente_nome"),
+        models.Patient.cognome.label("paziente_cognome")
+    ).join(
+        models.Doctor, models.Appointment.doctor_id == models.Doctor.id
+    ).join(
+        models.Patient, models.Appointment.patient_id == models.Patient.id
+    ).filter(
+        models.Appointment.room_id.in_(room_ids),
+        models.Appointment.data_appuntamento == data,
+        models.Appointment.stato != 'cancellato'
+    ).order_by(models.Appointment.room_id, models.Appointment.ora_inizio).all()
+
+def _appointment_entry(row) -> dict:
+    return {
+        "id": row.id,
+        "ora_inizio": str(row.ora_inizio),
+        "durata_minuti": row.durata_minuti,
+        "tipo_visita": row.tipo_visita,
+        "medico": f"{row.medico_nome} {row.medico_cognome}",
+        "paziente": f"{row.paziente_nome} {row.paziente_cognome}"
+    }
+
 @router.get("/", response_model=List[schemas.Room])
 def get_rooms(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     attiva: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Ottieni lista di tutte le sale visita"""
-    query = db.query(models.Room)
+    """Ottieni lista di tutte le sale visita (ETag, 304 se invariata)"""
+    def render() -> bytes:
+        query = db.query(models.Room)
+        
+        if attiva is not None:
+            query = query.filter(models.Room.attiva == attiva)
+        
+        rooms = query.offset(skip).limit(limit).all()
+        return room_list_adapter.dump_json(room_list_adapter.validate_python(rooms, from_attributes=True))
     
-    if attiva is not None:
-        query = query.filter(models.Room.attiva == attiva)
+    return cached_reference_response(request, "rooms", render, store=not is_replica(db))
+
+@router.get("/availability")
+def get_rooms_availability(data: date, db: Session = Depends(get_read_db)):
+    """Occupazione di tutte le sale attive per una data specifica"""
+    rooms = db.query(models.Room).filter(models.Room.attiva == True).order_by(models.Room.numero).all()
+    
+    appointments_by_room = {room.id: [] for room in rooms}
+    if rooms:
+        for row in _room_day_rows(db, data, list(appointments_by_room)):
+            appointments_by_room[row.room_id].append(_appointment_entry(row))
     
-    rooms = query.offset(skip).limit(limit).all()
-    return rooms
+    return {
+        "data": str(data),
+        "rooms": [
+            {
+                "room": {
+                    "id": room.id,
+                    "numero": room.numero,
+                    "nome": room.nome,
+                    "attrezzature": room.attrezzature
+                },
+                "appointments": appointments_by_room[room.id],
+                "total_appointments": len(appointments_by_room[room.id])
+            }
+            for room in rooms
+        ]
+    }
 
 @router.get("/{room_id}", response_model=schemas.Room)
-def get_room(room_id: int, db: Session = Depends(get_db)):
+def get_room(room_id: int, db: Session = Depends(get_read_db)):
     """Ottieni dettagli di una sala specifica"""
     room = db.query(models.Room).filter(models.Room.id == room_id).first()
     if not room:
@@ -36,7 +103,7 @@ def get_room(room_id: int, db: Session = Depends(get_db)):
 def get_room_availability(
     room_id: int,
     data: date,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Ottieni disponibilità di una sala per una data specifica"""
     room = db.query(models.Room).filter(models.Room.id == room_id).first()
@@ -55,26 +122,8 @@ def get_room_availability(
             "appointments": []
         }
     
-    # Ottieni appuntamenti per quella data
-    appointments = db.query(models.Appointment).filter(
-        models.Appointment.room_id == room_id,
-        models.Appointment.data_appuntamento == data,
-        models.Appointment.stato != 'cancellato'
-    ).order_by(models.Appointment.ora_inizio).all()
-    
-    appointment_list = []
-    for apt in appointments:
-        doctor = db.query(models.Doctor).filter(models.Doctor.id == apt.doctor_id).first()
-        patient = db.query(models.Patient).filter(models.Patient.id == apt.patient_id).first()
-        
-        appointment_list.append({
-            "id": apt.id,
-            "ora_inizio": str(apt.ora_inizio),
-            "durata_minuti": apt.durata_minuti,
-            "tipo_visita": apt.tipo_visita,
-            "medico": f"{doctor.nome} {doctor.cognome}",
-            "paziente": f"{patient.nome} {patient.cognome}"
-        })
+    # Appuntamenti per quella data con medico e paziente
+    appointment_list = [_appointment_entry(row) for row in _room_day_rows(db, data, [room_id])]
     
     return {
         "room": {
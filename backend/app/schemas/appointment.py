@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import date, time, datetime
 
 class AppointmentBase(BaseModel):
@@ -15,6 +15,23 @@ class AppointmentBase(BaseModel):
 class AppointmentCreate(AppointmentBase):
     pass
 
+class AppointmentBulkCreate(BaseModel):
+    appointments: List[AppointmentCreate]
+    # Se True basta un elemento rifiutato per non inserire nulla
+    atomico: bool = False
+
+class AppointmentBulkResult(BaseModel):
+    indice: int
+    esito: str  # 'creato', 'rifiutato' o 'annullato'
+    status_code: int
+    appointment_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class AppointmentBulkResponse(BaseModel):
+    creati: int
+    rifiutati: int
+    risultati: List[AppointmentBulkResult]
+
 class AppointmentUpdate(BaseModel):
     data_appuntamento: Optional[date] = None
     ora_inizio: Optional[time] = None
@@ -0,0 +1,251 @@
+"""Cache in-process della disponibilità per giornata medico.
+
+Per ogni coppia (doctor_id, data) viene memorizzata la bitmask degli slot
+occupati calcolata da scheduling.DoctorSchedule. Una giornata cambia solo
+quando un appuntamento viene creato, spostato o cancellato: le route di
+scrittura chiamano invalidate() con le giornate coinvolte dopo il commit.
+
+Una bitmask calcolata entra in cache solo se la generazione non è cambiata
+dall'inizio della transazione che l'ha letta: con REPEATABLE READ la
+transazione vede lo snapshot del suo inizio, non quello del calcolo.
+"""
+from collections import OrderedDict
+from datetime import date
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.app import models
+from backend.database import is_replica
+from backend.app.services.scheduling import DoctorSchedule, iter_days
+
+AVAILABILITY_CACHE_SIZE = 20000
+
+DoctorDay = Tuple[int, date]
+
+
+class AvailabilityCache:
+    """LRU limitata (doctor_id, data) -> bitmask degli slot occupati"""
+
+    def __init__(self, maxsize: int = AVAILABILITY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[DoctorDay, int]" = OrderedDict()
+        self._lock = Lock()
+        # Incrementata a ogni invalidazione: un calcolo iniziato prima di una
+        # scrittura non deve ripopolare la cache con dati ormai vecchi
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get_many(self, keys: Iterable[DoctorDay]) -> Tuple[Dict[DoctorDay, int], List[DoctorDay]]:
+        """Restituisce (valori trovati, chiavi mancanti)"""
+        found: Dict[DoctorDay, int] = {}
+        missing: List[DoctorDay] = []
+        with self._lock:
+            for key in keys:
+                mask = self._data.get(key)
+                if mask is None:
+                    missing.append(key)
+                else:
+                    self._data.move_to_end(key)
+                    found[key] = mask
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, values: Dict[DoctorDay, int], generation: int) -> None:
+        """Memorizza i valori calcolati se nel frattempo non ci sono state scritture"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            for key, mask in values.items():
+                self._data[key] = mask
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys: Iterable[DoctorDay]) -> None:
+        """Rimuove le giornate modificate da una scrittura"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+availability_cache = AvailabilityCache()
+
+GENERATION_KEY = "availability_generation"
+
+
+@event.listens_for(Session, "after_begin")
+def _remember_generation(session, transaction, connection):
+    # Letta prima della prima query della transazione, cioè prima del suo snapshot
+    session.info[GENERATION_KEY] = availability_cache.generation
+
+
+def snapshot_generation(db) -> int:
+    """Generazione valida per i dati letti nella transazione corrente della sessione"""
+    session = getattr(db, "sync_session", db)
+    if not session.in_transaction():
+        # La transazione (e il suo snapshot) inizierà con la prossima query
+        return availability_cache.generation
+    # -1 non coincide mai con la generazione corrente: il risultato non va in cache
+    return session.info.get(GENERATION_KEY, -1)
+
+
+def _lookup(
+    db,
+    schedules: Dict[int, DoctorSchedule],
+    start_date: date,
+    end_date: date
+) -> Tuple[int, Dict[DoctorDay, int], List[DoctorDay]]:
+    """Giornate lavorative richieste: (generazione, trovate in cache, mancanti)"""
+    keys = [
+        (doctor_id, giorno)
+        for giorno in iter_days(start_date, end_date)
+        for doctor_id, schedule in schedules.items()
+        if schedule.n_slots and schedule.works_on(giorno)
+    ]
+    generation = snapshot_generation(db)
+    found, missing = availability_cache.get_many(keys)
+    return generation, found, missing
+
+
+def busy_intervals_statement(missing: List[DoctorDay]):
+    """Un'unica query sugli intervalli occupati delle giornate mancanti"""
+    missing_doctors = {doctor_id for doctor_id, _ in missing}
+    missing_days = [giorno for _, giorno in missing]
+    return select(
+        models.Appointment.doctor_id,
+        models.Appointment.data_appuntamento,
+        models.Appointment.ora_inizio,
+        models.Appointment.durata_minuti
+    ).where(
+        models.Appointment.doctor_id.in_(list(missing_doctors)),
+        models.Appointment.data_appuntamento >= min(missing_days),
+        models.Appointment.data_appuntamento <= max(missing_days),
+        models.Appointment.stato != 'cancellato'
+    )
+
+
+def _compute_missing(
+    schedules: Dict[int, DoctorSchedule],
+    missing: List[DoctorDay],
+    busy_rows,
+    generation: int,
+    store: bool = True
+) -> Dict[DoctorDay, int]:
+    """Calcola e, se store, memorizza in cache le bitmask delle giornate mancanti"""
+    intervals: Dict[int, list] = {doctor_id: [] for doctor_id, _ in missing}
+    for doctor_id, giorno, ora_inizio, durata in busy_rows:
+        intervals[doctor_id].append((giorno, ora_inizio, durata))
+
+    masks_by_doctor = {
+        doctor_id: schedules[doctor_id].busy_masks(doctor_intervals)
+        for doctor_id, doctor_intervals in intervals.items()
+    }
+    computed = {
+        (doctor_id, giorno): masks_by_doctor[doctor_id].get(giorno, 0)
+        for doctor_id, giorno in missing
+    }
+    if store:
+        availability_cache.put_many(computed, generation)
+    return computed
+
+
+def _group_by_doctor(
+    schedules: Dict[int, DoctorSchedule],
+    masks: Dict[DoctorDay, int]
+) -> Dict[int, Dict[date, int]]:
+    result: Dict[int, Dict[date, int]] = {doctor_id: {} for doctor_id in schedules}
+    for (doctor_id, giorno), mask in masks.items():
+        if mask:
+            result[doctor_id][giorno] = mask
+    return result
+
+
+def load_busy_masks(
+    db: Session,
+    schedules: Dict[int, DoctorSchedule],
+    start_date: date,
+    end_date: date
+) -> Dict[int, Dict[date, int]]:
+    """Bitmask degli slot occupati per medico e giorno lavorativo.
+
+    Le giornate già in cache non vengono rilette; quelle mancanti si
+    caricano con un'unica query su tutti i medici coinvolti. Le giornate lette
+    da una replica non entrano in cache: potrebbero precedere l'ultima scrittura.
+    """
+    generation, found, missing = _lookup(db, schedules, start_date, end_date)
+    if missing:
+        busy_rows = db.execute(busy_intervals_statement(missing)).all()
+        found.update(_compute_missing(schedules, missing, busy_rows, generation, store=not is_replica(db)))
+    return _group_by_doctor(schedules, found)
+
+
+async def load_busy_masks_async(
+    db: AsyncSession,
+    schedules: Dict[int, DoctorSchedule],
+    start_date: date,
+    end_date: date
+) -> Dict[int, Dict[date, int]]:
+    """Come load_busy_masks, per una sessione asincrona"""
+    generation, found, missing = _lookup(db, schedules, start_date, end_date)
+    if missing:
+        busy_rows = (await db.execute(busy_intervals_statement(missing))).all()
+        found.update(_compute_missing(schedules, missing, busy_rows, generation, store=not is_replica(db)))
+    return _group_by_doctor(schedules, found)
+
+
+def load_day_masks(
+    db: Session,
+    schedules: Dict[int, DoctorSchedule],
+    doctor_days: Iterable[DoctorDay]
+) -> Dict[DoctorDay, int]:
+    """Bitmask degli slot occupati di giornate specifiche, anche non contigue.
+
+    Le giornate non lavorative sono escluse dal risultato.
+    """
+    keys = [
+        (doctor_id, giorno)
+        for doctor_id, giorno in doctor_days
+        if schedules[doctor_id].n_slots and schedules[doctor_id].works_on(giorno)
+    ]
+    generation = snapshot_generation(db)
+    found, missing = availability_cache.get_many(keys)
+    if missing:
+        busy_rows = db.execute(busy_intervals_statement(missing)).all()
+        found.update(_compute_missing(schedules, missing, busy_rows, generation))
+    return found
+
+
+def invalidate_doctor_days(*doctor_days: DoctorDay) -> None:
+    """Invalida le giornate (doctor_id, data) toccate da una scrittura"""
+    availability_cache.invalidate(doctor_days)
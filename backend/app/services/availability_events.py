@@ -0,0 +1,194 @@
+"""Aggiornamenti della disponibilità in push (Server-Sent Events).
+
+Dopo il commit di una prenotazione, di uno spostamento o di una
+cancellazione le route chiamano publish_availability() con le giornate
+(doctor_id, data) coinvolte. Per ogni giornata viene calcolata la bitmask
+degli slot liberi, nello stesso formato di available-slots?format=compact,
+e inviata a tutti i client iscritti a quel medico o a quella specializzazione.
+
+Il client carica uno snapshot con available-slots e poi sostituisce la
+bitmask dei giorni ricevuti: ogni evento contiene lo stato completo della
+giornata, quindi gli eventi si possono applicare più volte senza errori.
+
+La distribuzione è in-process: ogni iscritto ha una coda limitata nel proprio
+event loop. Un client troppo lento perde le delta in coda e riceve un evento
+"resync", dopo il quale deve ricaricare lo snapshot. Con più processi
+(worker uvicorn) ogni client riceve solo le scritture del proprio processo.
+"""
+import asyncio
+import itertools
+import json
+import logging
+from datetime import date
+from threading import Lock
+from typing import AsyncIterator, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app import models
+from backend.app.services.availability import load_day_masks
+from backend.app.services.scheduling import SLOT_MINUTES, DoctorSchedule
+
+logger = logging.getLogger(__name__)
+
+# Eventi in attesa per client prima di chiedere un resync
+AVAILABILITY_QUEUE_SIZE = 100
+
+# Commento SSE inviato in assenza di eventi, per tenere aperta la connessione
+AVAILABILITY_HEARTBEAT_SECONDS = 15
+
+# Attesa suggerita al browser prima di riconnettersi
+AVAILABILITY_RETRY_MILLISECONDS = 5000
+
+RESYNC_MESSAGE = "event: resync\ndata: {}\n\n"
+HEARTBEAT_MESSAGE = ": ping\n\n"
+
+DoctorDay = Tuple[int, date]
+
+_event_ids = itertools.count(1)
+
+
+def encode_event(event: str, payload: dict) -> str:
+    return f"id: {next(_event_ids)}\nevent: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    """Client iscritto: coda limitata nell'event loop che serve la sua connessione"""
+
+    __slots__ = ("queue", "loop", "doctor_id", "specializzazione", "resyncs")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, doctor_id: Optional[int],
+                 specializzazione: Optional[str], maxsize: int = AVAILABILITY_QUEUE_SIZE):
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize)
+        self.loop = loop
+        self.doctor_id = doctor_id
+        self.specializzazione = specializzazione
+        self.resyncs = 0
+
+    def matches(self, doctor_id: int, specializzazione: str) -> bool:
+        if self.doctor_id is not None and self.doctor_id != doctor_id:
+            return False
+        return self.specializzazione is None or self.specializzazione == specializzazione
+
+    def deliver(self, message: str) -> None:
+        """Eseguita nell'event loop dell'iscritto"""
+        if self.queue.full():
+            # Client in ritardo: le delta in coda non servono più, ricaricherà lo snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_MESSAGE)
+            self.resyncs += 1
+        self.queue.put_nowait(message)
+
+
+class AvailabilityBroker:
+    """Pub/sub in-process degli aggiornamenti di disponibilità"""
+
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = Lock()
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, doctor_id: Optional[int] = None, specializzazione: Optional[str] = None,
+                  maxsize: int = AVAILABILITY_QUEUE_SIZE) -> Subscriber:
+        """Da chiamare dentro l'event loop che leggerà la coda"""
+        subscriber = Subscriber(asyncio.get_running_loop(), doctor_id, specializzazione, maxsize)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, doctor_id: int, specializzazione: str, message: str) -> None:
+        """Thread-safe: le route sincrone pubblicano dal threadpool"""
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.matches(doctor_id, specializzazione)]
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, message)
+            except RuntimeError:
+                # Event loop chiuso: la connessione non esiste più
+                self.unsubscribe(subscriber)
+        self.published += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "resyncs": sum(s.resyncs for s in self._subscribers),
+            }
+
+
+availability_broker = AvailabilityBroker()
+
+
+def publish_availability(db: Session, *doctor_days: DoctorDay) -> None:
+    """Invia lo stato aggiornato delle giornate toccate da una scrittura (dopo il commit).
+
+    Senza iscritti non viene eseguita alcuna query. Un errore non deve far
+    fallire la scrittura, già confermata: viene solo registrato nel log.
+    """
+    if not availability_broker.subscriber_count or not doctor_days:
+        return
+    try:
+        days_by_doctor = {}
+        for doctor_id, giorno in set(doctor_days):
+            days_by_doctor.setdefault(doctor_id, []).append(giorno)
+        doctors = db.execute(
+            select(
+                models.Doctor.id,
+                models.Doctor.nome,
+                models.Doctor.cognome,
+                models.Doctor.specializzazione,
+                models.Doctor.orario_inizio,
+                models.Doctor.orario_fine,
+                models.Doctor.giorni_disponibili
+            ).where(models.Doctor.id.in_(list(days_by_doctor)))
+        ).all()
+        schedules = {doctor.id: DoctorSchedule.from_doctor(doctor) for doctor in doctors}
+        busy = load_day_masks(
+            db, schedules, [(doctor.id, giorno) for doctor in doctors for giorno in days_by_doctor[doctor.id]]
+        )
+        for doctor in doctors:
+            schedule = schedules[doctor.id]
+            for giorno in sorted(days_by_doctor[doctor.id]):
+                key = (doctor.id, giorno)
+                liberi = schedule.free_mask(busy[key]) if key in busy else 0
+                message = encode_event("availability", {
+                    "doctor_id": doctor.id,
+                    "nome_medico": f"{doctor.nome} {doctor.cognome}",
+                    "specializzazione": doctor.specializzazione,
+                    "data": str(giorno),
+                    "ora_inizio": schedule.slot_labels[0] if schedule.n_slots else None,
+                    "slot_minuti": SLOT_MINUTES,
+                    "liberi": liberi
+                })
+                availability_broker.publish(doctor.id, doctor.specializzazione, message)
+    except Exception:
+        logger.exception("Pubblicazione della disponibilità non riuscita")
+
+
+async def availability_events(doctor_id: Optional[int], specializzazione: Optional[str],
+                              is_disconnected) -> AsyncIterator[str]:
+    """Corpo della risposta text/event-stream: iscrive il client per la durata della connessione"""
+    subscriber = availability_broker.subscribe(doctor_id, specializzazione)
+    try:
+        yield f"retry: {AVAILABILITY_RETRY_MILLISECONDS}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), AVAILABILITY_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                message = HEARTBEAT_MESSAGE
+            yield message
+    finally:
+        availability_broker.unsubscribe(subscriber)
@@ -0,0 +1,107 @@
+"""Controllo delle sovrapposizioni tra prenotazioni.
+
+Gli intervalli sono semiaperti, [inizio, inizio + durata), in minuti dalla
+mezzanotte: due appuntamenti si sovrappongono se ciascuno inizia prima che
+l'altro finisca. Appuntamenti consecutivi (10:00-10:30 e 10:30-11:00) non
+sono in conflitto.
+
+Le query leggono solo (risorsa, data, ora_inizio, durata_minuti), colonne
+coperte dagli indici ix_appointments_doctor_data_stato e
+ix_appointments_room_data_ora; il confronto esatto sulla durata si fa qui,
+su poche righe per giornata.
+"""
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from backend.app import models
+from backend.app.services.scheduling import SLOT_MINUTES
+
+Interval = Tuple[int, int]
+ResourceDay = Tuple[int, date]
+
+
+def appointment_interval(ora_inizio: time, durata_minuti: Optional[int]) -> Interval:
+    start = ora_inizio.hour * 60 + ora_inizio.minute
+    return start, start + (durata_minuti or SLOT_MINUTES)
+
+
+def overlaps(a: Interval, b: Interval) -> bool:
+    return a[0] < b[1] and b[0] < a[1]
+
+
+class IntervalIndex:
+    """Intervalli occupati per (risorsa, giorno), esistenti e accettati nel lotto"""
+
+    def __init__(self):
+        self._intervals: Dict[ResourceDay, List[Interval]] = {}
+
+    def add(self, key: ResourceDay, interval: Interval) -> None:
+        self._intervals.setdefault(key, []).append(interval)
+
+    def conflicts(self, key: ResourceDay, interval: Interval) -> bool:
+        return any(overlaps(interval, other) for other in self._intervals.get(key, ()))
+
+
+def _intervals_statement(resource_column, keys: Iterable[ResourceDay]):
+    keys = list(keys)
+    days = [giorno for _, giorno in keys]
+    return select(
+        resource_column,
+        models.Appointment.data_appuntamento,
+        models.Appointment.ora_inizio,
+        models.Appointment.durata_minuti
+    ).where(
+        resource_column.in_({resource_id for resource_id, _ in keys}),
+        models.Appointment.data_appuntamento >= min(days),
+        models.Appointment.data_appuntamento <= max(days),
+        models.Appointment.stato != 'cancellato'
+    )
+
+
+def load_interval_index(db, resource_column, keys: Iterable[ResourceDay]) -> IntervalIndex:
+    """Un'unica query per tutte le giornate (risorsa, data) richieste"""
+    keys = set(keys)
+    index = IntervalIndex()
+    if not keys:
+        return index
+    for resource_id, giorno, ora_inizio, durata in db.execute(_intervals_statement(resource_column, keys)):
+        if (resource_id, giorno) in keys:
+            index.add((resource_id, giorno), appointment_interval(ora_inizio, durata))
+    return index
+
+
+def conflict_statement(resource_column, resource_id: int, giorno: date, interval: Interval,
+                       exclude_id: Optional[int] = None):
+    """Appuntamenti attivi della risorsa nel giorno che iniziano prima della fine di interval.
+
+    Una sola query di range sull'indice (risorsa, data, ...): tra i candidati
+    l'unico confronto mancante, fine esistente > inizio nuovo, dipende dalla
+    durata e si fa in find_conflict.
+    """
+    stmt = select(
+        models.Appointment.id,
+        models.Appointment.ora_inizio,
+        models.Appointment.durata_minuti
+    ).where(
+        resource_column == resource_id,
+        models.Appointment.data_appuntamento == giorno,
+        models.Appointment.stato != 'cancellato'
+    )
+    if interval[1] < 24 * 60:
+        stmt = stmt.where(models.Appointment.ora_inizio < time(*divmod(interval[1], 60)))
+    if exclude_id is not None:
+        stmt = stmt.where(models.Appointment.id != exclude_id)
+    return stmt
+
+
+def find_conflict(db, resource_column, resource_id: int, giorno: date, ora_inizio: time,
+                  durata_minuti: Optional[int], exclude_id: Optional[int] = None) -> Optional[int]:
+    """Id del primo appuntamento che si sovrappone all'intervallo, o None"""
+    interval = appointment_interval(ora_inizio, durata_minuti)
+    rows = db.execute(conflict_statement(resource_column, resource_id, giorno, interval, exclude_id))
+    for appointment_id, other_start, other_durata in rows:
+        if overlaps(interval, appointment_interval(other_start, other_durata)):
+            return appointment_id
+    return None
@@ -0,0 +1,61 @@
+"""Esportazione in streaming (NDJSON o CSV).
+
+Le righe vengono lette con un cursore lato server (yield_per implica
+stream_results) e scritte a blocchi di EXPORT_BATCH_SIZE: la memoria resta
+costante anche per un anno di dati e i primi byte partono subito.
+
+La sessione è aperta dal generatore stesso e non dalla dependency get_read_db,
+perché deve restare aperta finché la risposta non è stata inviata tutta. La
+route sceglie però il sessionmaker con la stessa regola (read_session_factory):
+replica se configurata, primario subito dopo una scrittura dello stesso client.
+"""
+import csv
+import io
+import json
+from typing import Callable, Dict, Iterator, List, Sequence
+
+from sqlalchemy.orm import sessionmaker
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def iter_batches(session_factory: sessionmaker, stmt,
+                 to_entry: Callable[[object], Dict]) -> Iterator[List[Dict]]:
+    """Esegue stmt in streaming e restituisce le righe convertite a blocchi"""
+    db = session_factory()
+    try:
+        result = db.execute(stmt, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+        for rows in result.partitions():
+            yield [to_entry(row) for row in rows]
+    finally:
+        db.close()
+
+
+def ndjson_chunks(batches: Iterator[List[Dict]]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+
+
+def csv_chunks(batches: Iterator[List[Dict]], columns: Sequence[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    # L'intestazione parte prima della query
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def export_chunks(fmt: str, batches: Iterator[List[Dict]], columns: Sequence[str]) -> Iterator[str]:
+    if fmt == "csv":
+        return csv_chunks(batches, columns)
+    return ndjson_chunks(batches)
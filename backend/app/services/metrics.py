@@ -0,0 +1,283 @@
+"""Metriche delle richieste HTTP in formato testo Prometheus.
+
+MetricsMiddleware misura ogni richiesta (latenza, dimensione della risposta,
+richieste in corso) e, tramite gli eventi dell'engine SQLAlchemy, il numero
+di istruzioni SQL e il tempo passato sul database. Le serie sono etichettate
+con il template della route (es. /api/patients/{patient_id}), non con il path
+effettivo, così che il numero di serie resti limitato.
+
+Le connessioni Server-Sent Events restano aperte per minuti: da quando
+partono gli header non contano più tra le richieste in corso ma tra gli
+stream aperti, la latenza registrata è il tempo fino agli header e la durata
+della connessione va in un istogramma a parte.
+"""
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from backend.app.services import query_budget
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+STREAM_BUCKETS = (1.0, 10.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 14400.0)
+
+# Risposte di lunga durata misurate a parte (availability/stream)
+STREAM_CONTENT_TYPE = b"text/event-stream"
+
+# Etichetta per le richieste che non corrispondono a nessuna route (404)
+UNMATCHED_ROUTE = "unmatched"
+
+INF_BUCKET = 'le="+Inf"'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class RequestStats:
+    """Contatori SQL della richiesta corrente"""
+
+    __slots__ = ('statements', 'db_seconds', 'shapes')
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        # testo SQL -> esecuzioni, per il controllo N+1 di query_budget
+        self.shapes: Dict[str, int] = {}
+
+
+# Impostata dal middleware: il threadpool di Starlette copia il contesto,
+# quindi anche le route sincrone aggiornano le statistiche della richiesta
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+        self._lock = Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            value = self._value
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # labels -> [conteggi per bucket (non cumulativi), somma, conteggio]
+        self._series: Dict[Labels, list] = {}
+        self._lock = Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels, INF_BUCKET)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+requests_total = Counter("http_requests_total", "Richieste HTTP completate")
+request_duration = Histogram(
+    "http_request_duration_seconds", "Durata delle richieste HTTP", LATENCY_BUCKETS
+)
+response_size = Histogram(
+    "http_response_size_bytes", "Dimensione del corpo delle risposte HTTP", SIZE_BUCKETS
+)
+requests_in_flight = Gauge("http_requests_in_flight", "Richieste HTTP in corso")
+streams_open = Gauge("http_streams_open", "Connessioni Server-Sent Events aperte")
+stream_duration = Histogram(
+    "http_stream_duration_seconds", "Durata delle connessioni Server-Sent Events", STREAM_BUCKETS
+)
+request_statements = Histogram(
+    "db_statements_per_request", "Istruzioni SQL eseguite per richiesta", STATEMENT_BUCKETS
+)
+request_db_time = Histogram(
+    "db_time_per_request_seconds", "Tempo passato sul database per richiesta", LATENCY_BUCKETS
+)
+statements_total = Counter("db_statements_total", "Istruzioni SQL eseguite (anche fuori dalle richieste)")
+db_time_total = Counter("db_time_seconds_total", "Tempo totale passato sul database")
+query_budget_violations = Counter(
+    "db_query_budget_violations_total", "Richieste oltre il budget di query o con istruzioni ripetute (N+1)"
+)
+
+METRICS = (
+    requests_total, request_duration, response_size, requests_in_flight,
+    streams_open, stream_duration, request_statements, request_db_time, statements_total, db_time_total,
+    query_budget_violations,
+)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    statements_total.inc()
+    db_time_total.inc(amount=elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        stats.shapes[statement] = stats.shapes.get(statement, 0) + 1
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Registra gli eventi di misura sull'engine (per AsyncEngine usare .sync_engine)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI che registra le metriche di ogni richiesta HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+        body_size = 0
+        # Istante degli header, se la risposta è uno stream SSE
+        stream_started = None
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_size, stream_started
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                if content_type.startswith(STREAM_CONTENT_TYPE):
+                    stream_started = time.perf_counter()
+                    requests_in_flight.dec()
+                    streams_open.inc()
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finished = time.perf_counter()
+            if stream_started is None:
+                requests_in_flight.dec()
+            else:
+                streams_open.dec()
+            _current_request.reset(token)
+
+            # Il router di Starlette aggiunge la route trovata allo scope
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            labels = (("method", scope["method"]), ("route", route))
+            requests_total.inc(labels + (("status", str(status_code)),))
+            if stream_started is None:
+                request_duration.observe(labels, finished - started)
+                response_size.observe(labels, body_size)
+            else:
+                request_duration.observe(labels, stream_started - started)
+                stream_duration.observe(labels, finished - stream_started)
+            request_statements.observe(labels, stats.statements)
+            request_db_time.observe(labels, stats.db_seconds)
+
+        if route != UNMATCHED_ROUTE and query_budget.QUERY_BUDGET_MODE != "off":
+            violations = query_budget.find_violations(scope["method"], route, stats.statements, stats.shapes)
+            for kind, _ in violations:
+                query_budget_violations.inc(labels + (("kind", kind),))
+            query_budget.report_violations(scope["method"], route, violations)
@@ -0,0 +1,75 @@
+"""Paginazione keyset con cursori opachi.
+
+Il cursore codifica i valori delle colonne di ordinamento dell'ultima riga
+restituita; la pagina successiva riparte da lì con un confronto indicizzato
+invece di scartare righe con OFFSET. Tutte le route paginate restituiscono il
+cursore della pagina successiva nell'header X-Next-Cursor.
+"""
+import base64
+import json
+from datetime import date, time
+from typing import Callable, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+
+# Convertitori per le colonne di ordinamento più comuni
+DATE_TIME_ID = (date.fromisoformat, time.fromisoformat, int)
+
+
+def _encode_value(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Codifica i valori di ordinamento dell'ultima riga in un cursore opaco"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, converters: Sequence[Callable]) -> tuple:
+    """Decodifica un cursore prodotto da encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(raw) != len(converters):
+            raise ValueError(cursor)
+        return tuple(convert(v) for convert, v in zip(converters, raw))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursore non valido")
+
+
+def keyset_filter(columns: Sequence, values: Sequence, descending=True):
+    """Condizione 'dopo il cursore' per un ordinamento sulle colonne date.
+
+    descending può essere un bool o una sequenza con la direzione di ogni
+    colonna. Espansa come (a < x) OR (a = x AND b < y) OR ... così che il
+    prefisso dell'indice sulle colonne di ordinamento possa servire il range.
+    """
+    if isinstance(descending, bool):
+        descending = [descending] * len(columns)
+    clauses = []
+    for i, (column, value, desc) in enumerate(zip(columns, values, descending)):
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        step = column < value if desc else column > value
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def split_page(rows: Sequence, limit: int, key: Callable) -> Tuple[list, Optional[str]]:
+    """Separa la pagina dalla riga di controllo (query eseguita con limit + 1).
+
+    Restituisce (righe della pagina, cursore successivo o None se finite).
+    """
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    return page, encode_cursor(key(page[-1]))
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    # Il corpo resta invariato; il cursore della pagina successiva va nell'header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
@@ -0,0 +1,61 @@
+"""Ricerca pazienti su un indice di token normalizzati.
+
+Nome, cognome e codice fiscale vengono scomposti in token minuscoli senza
+accenti e salvati in patient_search_tokens. Una ricerca diventa una serie di
+range per prefisso sulla chiave primaria (token, patient_id), al posto di
+LIKE '%termine%' che scandisce l'intera tabella pazienti.
+"""
+from typing import Iterable, List
+
+from sqlalchemy import case, func, literal, select, union_all
+
+from backend.app import models
+from backend.app.models.patient_search_token import normalize
+
+MAX_SEARCH_TERMS = 5
+
+
+def prefix_upper_bound(term: str) -> str:
+    """Primo valore dopo tutti i token che iniziano con term (range indicizzabile su ogni backend).
+
+    Richiede l'ordinamento per byte della colonna token (migrazione 6 su MySQL).
+    """
+    return term[:-1] + chr(ord(term[-1]) + 1)
+
+
+def search_terms(search: str) -> List[str]:
+    return normalize(search)[:MAX_SEARCH_TERMS]
+
+
+def search_statement(terms: Iterable[str]):
+    """Pazienti che hanno un token per ogni termine, ordinati per pertinenza.
+
+    Ogni termine vale 2 se coincide con un token, 1 se ne è solo un prefisso.
+    """
+    Token = models.PatientSearchToken
+    per_term = [
+        select(
+            Token.patient_id.label("patient_id"),
+            literal(i).label("term"),
+            func.max(case((Token.token == term, 2), else_=1)).label("score")
+        ).where(
+            Token.token >= term,
+            Token.token < prefix_upper_bound(term)
+        ).group_by(Token.patient_id)
+        for i, term in enumerate(terms)
+    ]
+    matches = union_all(*per_term).subquery()
+    ranked = select(
+        matches.c.patient_id,
+        func.sum(matches.c.score).label("score")
+    ).group_by(
+        matches.c.patient_id
+    ).having(
+        func.count(matches.c.term) == len(per_term)
+    ).subquery()
+
+    return select(models.Patient).join(
+        ranked, ranked.c.patient_id == models.Patient.id
+    ).order_by(
+        ranked.c.score.desc(), models.Patient.cognome, models.Patient.nome, models.Patient.id
+    )
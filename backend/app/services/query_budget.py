@@ -0,0 +1,78 @@
+"""Budget di query per route e rilevamento di pattern N+1.
+
+Alla fine di ogni richiesta MetricsMiddleware confronta le istruzioni SQL
+eseguite con il budget della route e cerca istruzioni con la stessa forma
+ripetute più volte (tipicamente una query dentro un ciclo). In modalità
+"warn" le violazioni vengono solo registrate nel log; in modalità "raise"
+(test) la richiesta fallisce con QueryBudgetExceeded.
+"""
+import logging
+import os
+import re
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "off", "warn" (default) o "raise"
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+
+# Istruzioni ammesse per le route senza un budget esplicito
+DEFAULT_QUERY_BUDGET = int(os.getenv("QUERY_BUDGET_DEFAULT", "10"))
+
+# Oltre questo numero di esecuzioni della stessa forma si segnala un N+1
+REPEATED_STATEMENT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "3"))
+
+# Budget delle route più frequenti, autenticazione compresa (utente non in cache)
+QUERY_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("GET", "/api/patients/{patient_id}/history"): 4,
+    ("GET", "/api/appointments/"): 2,
+    ("GET", "/api/appointments/detailed"): 2,
+    ("GET", "/api/appointments/available-slots"): 2,
+    ("GET", "/api/appointments/waiting-list"): 2,
+    ("GET", "/api/doctors/{doctor_id}/availability"): 2,
+    ("GET", "/api/rooms/availability"): 2,
+    ("GET", "/api/rooms/{room_id}/availability"): 2,
+    ("POST", "/api/appointments/bulk"): 9,
+    ("POST", "/api/auth/login/patient"): 1,
+    ("POST", "/api/auth/login/doctor"): 1,
+}
+
+# Liste di parametri di lunghezza variabile (IN espansi): "(?, ?, ?)" -> "(?)"
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s)(?:\s*,\s*(?:\?|%s|%\(\w+\)s))+\s*\)")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Sollevata in modalità "raise" quando una richiesta viola il budget"""
+
+
+def statement_shape(statement: str) -> str:
+    """Forma di un'istruzione, indipendente dal numero di parametri"""
+    return _PARAMETER_LIST.sub("(?)", " ".join(statement.split()))
+
+
+def find_violations(method: str, route: str, statements: int,
+                    shapes: Dict[str, int]) -> List[Tuple[str, str]]:
+    """Restituisce le violazioni come coppie (tipo, descrizione)"""
+    violations = []
+    budget = QUERY_BUDGETS.get((method, route), DEFAULT_QUERY_BUDGET)
+    if statements > budget:
+        violations.append(("budget", f"{statements} istruzioni SQL, budget {budget}"))
+
+    repeated: Dict[str, int] = {}
+    for statement, count in shapes.items():
+        shape = statement_shape(statement)
+        repeated[shape] = repeated.get(shape, 0) + count
+    for shape, count in repeated.items():
+        if count > REPEATED_STATEMENT_LIMIT:
+            violations.append(("repeated", f"{count} esecuzioni di: {shape[:200]}"))
+    return violations
+
+
+def report_violations(method: str, route: str, violations: List[Tuple[str, str]]) -> None:
+    """Registra le violazioni nel log o, in modalità "raise", solleva un'eccezione"""
+    if not violations:
+        return
+    message = f"{method} {route}: " + "; ".join(description for _, description in violations)
+    if QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning("Possibile N+1 o budget di query superato - %s", message)
@@ -0,0 +1,66 @@
+"""Instradamento delle letture verso la replica e finestra read-your-writes.
+
+Con READ_DATABASE_URL impostato le route di sola lettura usano la replica
+(get_read_db in backend/database.py). Una replica è in ritardo sul primario:
+dopo il commit di una scrittura, per READ_YOUR_WRITES_SECONDS secondi le
+letture dello stesso client tornano al primario, così chi ha appena
+prenotato vede subito il proprio appuntamento.
+
+Il client è identificato dall'header Authorization (solo il suo hash viene
+memorizzato) o, in mancanza, dall'indirizzo IP.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from fastapi import Request
+
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Client ricordati al massimo: oltre si scartano le scritture più vecchie
+RECENT_WRITES_SIZE = 10000
+
+
+def client_key(request: Request) -> str:
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return hashlib.blake2b(authorization.encode(), digest_size=16).hexdigest()
+    return request.client.host if request.client else ""
+
+
+class RecentWrites:
+    """LRU limitata client -> istante fino al quale leggere dal primario"""
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS, maxsize: int = RECENT_WRITES_SIZE):
+        self.window = window
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = Lock()
+        self.primary_reads = 0
+
+    def mark(self, key: str) -> None:
+        with self._lock:
+            self._data[key] = time.monotonic() + self.window
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def is_recent(self, key: str) -> bool:
+        with self._lock:
+            until = self._data.get(key)
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self._data[key]
+                return False
+            self.primary_reads += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"clients": len(self._data), "window_seconds": self.window, "primary_reads": self.primary_reads}
+
+
+recent_writes = RecentWrites()
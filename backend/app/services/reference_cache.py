@@ -0,0 +1,139 @@
+"""Cache HTTP dei dati di riferimento (medici, sale).
+
+Le liste di medici e sale cambiano raramente ma il frontend le richiede a
+ogni caricamento di pagina. Il corpo JSON serializzato viene memorizzato per
+(tipo, path, query) insieme al suo ETag; le route di scrittura chiamano
+invalidate_reference() dopo il commit, che incrementa la versione del tipo
+e scarta le risposte memorizzate.
+
+Con Cache-Control: no-cache il browser rivalida sempre: se If-None-Match
+corrisponde alla risposta in cache si restituisce 304 senza query. L'ETag è
+un hash del contenuto, quindi resta coerente tra processi diversi; la durata
+massima di una voce (REFERENCE_CACHE_TTL_SECONDS) limita quanto a lungo un
+processo può servire dati modificati da un altro.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+REFERENCE_CACHE_SIZE = 256
+REFERENCE_CACHE_TTL_SECONDS = 300
+REFERENCE_CACHE_CONTROL = "no-cache"
+
+REFERENCE_KINDS = ("doctors", "rooms")
+
+CacheKey = Tuple[str, str, str]
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: bytes
+    expires_at: float
+
+
+def compute_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Confronto debole di If-None-Match (lista di ETag, W/ o *)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+class ReferenceCache:
+    """LRU limitata (tipo, path, query) -> risposta serializzata con ETag"""
+
+    def __init__(self, maxsize: int = REFERENCE_CACHE_SIZE, ttl: float = REFERENCE_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._lock = Lock()
+        self._versions: Dict[str, int] = {kind: 0 for kind in REFERENCE_KINDS}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self, kind: str) -> int:
+        return self._versions[kind]
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def entry(self, body: bytes) -> CachedResponse:
+        return CachedResponse(compute_etag(body), body, time.monotonic() + self.ttl)
+
+    def put(self, key: CacheKey, body: bytes, version: int) -> CachedResponse:
+        """Memorizza la risposta se nel frattempo il tipo non è stato modificato"""
+        entry = self.entry(body)
+        with self._lock:
+            if version == self._versions[key[0]]:
+                self._data[key] = entry
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return entry
+
+    def invalidate(self, kind: str) -> None:
+        with self._lock:
+            self._versions[kind] += 1
+            for key in [key for key in self._data if key[0] == kind]:
+                del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "versions": dict(self._versions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+
+reference_cache = ReferenceCache()
+
+
+def cached_reference_response(request: Request, kind: str, render: Callable[[], bytes],
+                              store: bool = True) -> Response:
+    """Risposta JSON con ETag; 304 se il client ha già la versione corrente.
+
+    render viene chiamata (e il database letto) solo se la risposta non è in cache.
+    Con store=False (lettura da una replica) la risposta non viene memorizzata.
+    """
+    key = (kind, request.url.path, request.url.query)
+    entry = reference_cache.get(key)
+    if entry is None:
+        version = reference_cache.version(kind)
+        body = render()
+        entry = reference_cache.put(key, body, version) if store else reference_cache.entry(body)
+
+    headers = {"ETag": entry.etag, "Cache-Control": REFERENCE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        reference_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def invalidate_reference(kind: str) -> None:
+    """Da chiamare dopo il commit di una scrittura su medici o sale"""
+    reference_cache.invalidate(kind)
@@ -0,0 +1,136 @@
+"""Motore di calcolo della disponibilità dei medici.
+
+Ogni giornata di un medico è rappresentata come una bitmask di slot da
+SLOT_MINUTES minuti a partire da orario_inizio: il bit i è acceso se lo
+slot i è occupato. Un appuntamento occupa tutti gli slot che interseca,
+in base a ora_inizio e durata_minuti.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+SLOT_MINUTES = 30
+
+GIORNI_MAP = {
+    'lun': 0, 'mar': 1, 'mer': 2, 'gio': 3, 'ven': 4, 'sab': 5, 'dom': 6
+}
+
+
+def parse_giorni(giorni_disponibili: str) -> frozenset:
+    """Converte 'lun,mer,ven' nell'insieme dei weekday corrispondenti"""
+    return frozenset(
+        GIORNI_MAP[g.strip()] for g in giorni_disponibili.split(',') if g.strip()
+    )
+
+
+def _minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+class DoctorSchedule:
+    """Griglia degli slot di un medico (orari e giorni lavorativi)"""
+
+    __slots__ = ('weekdays', 'start_minute', 'n_slots', 'full_mask', 'slot_times', 'slot_labels')
+
+    def __init__(self, orario_inizio: time, orario_fine: time, giorni_disponibili: str):
+        self.weekdays = parse_giorni(giorni_disponibili)
+        self.start_minute = _minutes(orario_inizio)
+
+        # Come in precedenza: uno slot è valido se inizia prima di orario_fine
+        span = _minutes(orario_fine) - self.start_minute
+        self.n_slots = max(0, -(-span // SLOT_MINUTES))
+        self.full_mask = (1 << self.n_slots) - 1
+
+        base = datetime.combine(date.today(), orario_inizio)
+        self.slot_times = [
+            (base + timedelta(minutes=SLOT_MINUTES * i)).time() for i in range(self.n_slots)
+        ]
+        self.slot_labels = [str(t) for t in self.slot_times]
+
+    @classmethod
+    def from_doctor(cls, doctor) -> "DoctorSchedule":
+        return cls(doctor.orario_inizio, doctor.orario_fine, doctor.giorni_disponibili)
+
+    def works_on(self, giorno: date) -> bool:
+        return giorno.weekday() in self.weekdays
+
+    def interval_mask(self, ora_inizio: time, durata_minuti: Optional[int]) -> int:
+        """Bitmask degli slot intersecati dall'intervallo [ora_inizio, ora_inizio + durata)"""
+        start = _minutes(ora_inizio) - self.start_minute
+        end = start + (durata_minuti or SLOT_MINUTES)
+        first = max(0, start // SLOT_MINUTES)
+        last = min(self.n_slots, -(-end // SLOT_MINUTES))
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def busy_masks(self, intervals: Iterable[Tuple[date, time, Optional[int]]]) -> Dict[date, int]:
+        """Raggruppa gli intervalli occupati (data, ora_inizio, durata) per giorno"""
+        masks: Dict[date, int] = {}
+        for giorno, ora_inizio, durata in intervals:
+            mask = self.interval_mask(ora_inizio, durata)
+            if mask:
+                masks[giorno] = masks.get(giorno, 0) | mask
+        return masks
+
+    def free_indexes(self, busy_mask: int) -> List[int]:
+        """Indici degli slot liberi, in ordine crescente"""
+        free = self.full_mask & ~busy_mask
+        if free == self.full_mask:
+            return list(range(self.n_slots))
+        indexes = []
+        while free:
+            low = free & -free
+            indexes.append(low.bit_length() - 1)
+            free ^= low
+        return indexes
+
+    def free_mask(self, busy_mask: int) -> int:
+        """Bitmask degli slot liberi (bit i acceso se lo slot i è libero)"""
+        return self.full_mask & ~busy_mask
+
+    def free_labels(self, busy_mask: int) -> List[str]:
+        """Orari ('HH:MM:SS') degli slot liberi"""
+        if not busy_mask:
+            return self.slot_labels
+        labels = self.slot_labels
+        return [labels[i] for i in self.free_indexes(busy_mask)]
+
+
+def iter_days(start_date: date, end_date: date) -> Iterator[date]:
+    """Tutte le date tra start_date e end_date, estremi inclusi"""
+    for ordinal in range(start_date.toordinal(), end_date.toordinal() + 1):
+        yield date.fromordinal(ordinal)
+
+
+def iter_free_slots(
+    schedule: DoctorSchedule,
+    start_date: date,
+    end_date: date,
+    busy_by_day: Dict[date, int]
+) -> Iterator[Tuple[str, List[str]]]:
+    """Per ogni giorno lavorativo restituisce (data, orari liberi)"""
+    if not schedule.n_slots or not schedule.weekdays:
+        return
+    for giorno in iter_days(start_date, end_date):
+        if giorno.weekday() not in schedule.weekdays:
+            continue
+        labels = schedule.free_labels(busy_by_day.get(giorno, 0))
+        if labels:
+            yield str(giorno), labels
+
+
+def iter_free_masks(
+    schedule: DoctorSchedule,
+    start_date: date,
+    end_date: date,
+    busy_by_day: Dict[date, int]
+) -> Iterator[Tuple[str, int]]:
+    """Come iter_free_slots, ma restituisce (data, bitmask degli slot liberi)"""
+    if not schedule.n_slots or not schedule.weekdays:
+        return
+    for giorno in iter_days(start_date, end_date):
+        if giorno.weekday() not in schedule.weekdays:
+            continue
+        mask = schedule.free_mask(busy_by_day.get(giorno, 0))
+        if mask:
+            yield str(giorno), mask
@@ -0,0 +1,63 @@
+"""Percorso veloce di serializzazione per le liste lunghe.
+
+Le route che restituiscono molte righe già lette dal database (quindi già
+valide) non hanno bisogno della validazione Pydantic di response_model:
+RowSerializer legge i campi dello schema con un attrgetter precompilato e
+FastJSONResponse li codifica con orjson, se installato, altrimenti con json
+della libreria standard. Il formato di date e orari è lo stesso di Pydantic.
+"""
+import json
+from datetime import date, datetime, time
+from operator import attrgetter
+from typing import Any, Iterable, List, Type
+
+from fastapi import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # facoltativo: più lento ma stesso output
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    raise TypeError(f"Tipo non serializzabile: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class RowSerializer:
+    """Converte oggetti ORM o Row nei dict dei campi di uno schema, senza validazione"""
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.fields = tuple(schema.model_fields)
+        getter = attrgetter(*self.fields)
+        # attrgetter con un solo campo restituisce il valore, non una tupla
+        self._values = getter if len(self.fields) > 1 else (lambda row: (getter(row),))
+
+    def columns(self, model) -> list:
+        """Colonne del modello corrispondenti ai campi dello schema (per select mirate)"""
+        return [getattr(model, field) for field in self.fields]
+
+    def one(self, row) -> dict:
+        return dict(zip(self.fields, self._values(row)))
+
+    def many(self, rows: Iterable) -> List[dict]:
+        fields = self.fields
+        values = self._values
+        return [dict(zip(fields, values(row))) for row in rows]
+
+
+class FastJSONResponse(Response):
+    """JSONResponse con orjson; il contenuto deve essere già composto da tipi semplici"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,6 @@
+"""Benchmark degli endpoint su un database locale popolato da generate_data.
+
+Uso:
+    python -m backend.benchmarks run --scales small,medium --output bench.json
+    python -m backend.benchmarks compare before.json after.json
+"""
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from backend.benchmarks.scales import SCALES
+
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "medical_management_bench")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "sconosciuto"
+
+
+def run_scale(args) -> int:
+    """Eseguito nel sottoprocesso: DATABASE_URL è già impostata"""
+    from backend.benchmarks.suite import run
+
+    only = args.only.split(",") if args.only else None
+    results = run(SCALES[args.scale], args.iterations, args.seed, only)
+    json.dump(results, sys.stdout)
+    return 0
+
+
+def run_all(args) -> int:
+    os.makedirs(args.workdir, exist_ok=True)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "seed": args.seed,
+        },
+        "scales": {},
+    }
+
+    for scale in args.scales.split(","):
+        if args.db_url:
+            db_url = args.db_url
+        else:
+            # Un file SQLite per scala e seme: il seeding si fa una volta sola
+            db_url = f"sqlite:///{os.path.join(args.workdir, f'{scale}_{args.seed}.db')}"
+
+        print(f"== {scale} ({db_url})", file=sys.stderr)
+        command = [
+            sys.executable, "-m", "backend.benchmarks", "_scale",
+            "--scale", scale, "--iterations", str(args.iterations), "--seed", str(args.seed),
+        ]
+        if args.only:
+            command += ["--only", args.only]
+        env = dict(os.environ, DATABASE_URL=db_url)
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            return completed.returncode
+
+        results = json.loads(completed.stdout.strip().splitlines()[-1])
+        report["scales"][scale] = {"database": db_url.split("://")[0], "results": results}
+        print_results(results)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Risultati salvati in {args.output}", file=sys.stderr)
+    return 0
+
+
+def print_results(results: dict) -> None:
+    print(f"{'endpoint':40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'SQL':>6}", file=sys.stderr)
+    for nome, r in results.items():
+        if "error" in r:
+            print(f"{nome:40} errore {r['error']}", file=sys.stderr)
+            continue
+        print(f"{nome:40} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+              f"{r['throughput_rps']:8.1f} {r['sql_statements']:6.1f}", file=sys.stderr)
+
+
+def compare(args) -> int:
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    for scale, data in after["scales"].items():
+        if scale not in before["scales"]:
+            continue
+        print(f"== {scale}")
+        print(f"{'endpoint':40} {'p50 prima':>10} {'p50 dopo':>10} {'x':>7} {'SQL prima':>10} {'SQL dopo':>9}")
+        old_results = before["scales"][scale]["results"]
+        for nome, new in data["results"].items():
+            old = old_results.get(nome)
+            if not old or "error" in old or "error" in new:
+                continue
+            ratio = old["p50_ms"] / new["p50_ms"] if new["p50_ms"] else float("inf")
+            print(f"{nome:40} {old['p50_ms']:10.2f} {new['p50_ms']:10.2f} {ratio:7.2f} "
+                  f"{old['sql_statements']:10.1f} {new['sql_statements']:9.1f}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="esegue il benchmark e salva i risultati in JSON")
+    p_run.add_argument("--scales", default="small", help=f"scale separate da virgola ({', '.join(SCALES)})")
+    p_run.add_argument("--iterations", type=int, default=50)
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--db-url", default=None, help="database da usare (es. MySQL locale vuoto) al posto di SQLite")
+    p_run.add_argument("--workdir", default=DEFAULT_WORKDIR, help="cartella dei database SQLite popolati")
+    p_run.add_argument("--only", default=None, help="prefissi degli endpoint da misurare, es. appointments,auth")
+    p_run.add_argument("--output", default="bench.json")
+    p_run.set_defaults(func=run_all)
+
+    p_scale = sub.add_parser("_scale")
+    p_scale.add_argument("--scale", required=True, choices=list(SCALES))
+    p_scale.add_argument("--iterations", type=int, default=50)
+    p_scale.add_argument("--seed", type=int, default=42)
+    p_scale.add_argument("--only", default=None)
+    p_scale.set_defaults(func=run_scale)
+
+    p_compare = sub.add_parser("compare", help="confronta due file di risultati")
+    p_compare.add_argument("before")
+    p_compare.add_argument("after")
+    p_compare.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Stress test multi-thread delle prenotazioni.
+
+Più thread prenotano in parallelo, tramite create_appointment, orari scelti
+a caso in un insieme ristretto (pochi medici, pochi giorni): le collisioni
+sono frequenti e molte richieste superano il controllo preliminare insieme.
+Al termine si verifica che tra gli appuntamenti attivi non ci siano
+sovrapposizioni e si riporta il throughput.
+
+Uso:
+    python -m backend.benchmarks.booking_stress --threads 16 --attempts 2000
+    DATABASE_URL=mysql+pymysql://... python -m backend.benchmarks.booking_stress
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.booking_stress")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--attempts", type=int, default=2000, help="prenotazioni tentate in totale")
+    parser.add_argument("--doctors", type=int, default=3, help="medici su cui concentrare le prenotazioni")
+    parser.add_argument("--days", type=int, default=2, help="giorni su cui concentrare le prenotazioni")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if "DATABASE_URL" not in os.environ:
+        # Database SQLite usa e getta; va impostato prima di importare backend.database
+        path = os.path.join(tempfile.mkdtemp(prefix="booking_stress_"), "stress.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from fastapi import HTTPException
+    from sqlalchemy import select
+    from backend import generate_data
+    from backend.app import models
+    from backend.app.routers.appointments import create_appointment
+    from backend.app.schemas.appointment import AppointmentCreate
+    from backend.app.services.booking import appointment_interval, overlaps
+    from backend.app.services.scheduling import DoctorSchedule
+    from backend.database import SessionLocal, engine
+    from backend.migrations import upgrade
+
+    print(f"Database: {os.environ['DATABASE_URL']}")
+    upgrade(engine)
+    with SessionLocal() as db:
+        if not db.scalar(select(models.Doctor.id).limit(1)):
+            generate_data.main(["--doctors", "10", "--patients", "200", "--months", "1", "--seed", str(args.seed)])
+        doctors = db.execute(
+            select(models.Doctor.id, models.Doctor.orario_inizio, models.Doctor.orario_fine,
+                   models.Doctor.giorni_disponibili).order_by(models.Doctor.id).limit(args.doctors)
+        ).all()
+        patient_ids = db.scalars(select(models.Patient.id).limit(500)).all()
+        room_ids = db.scalars(select(models.Room.id)).all()
+
+    # Giorni lavorativi futuri, oltre il preavviso minimo
+    schedules = {doctor.id: DoctorSchedule.from_doctor(doctor) for doctor in doctors}
+    candidates = []
+    giorno = date.today() + timedelta(days=60)
+    while len({d for _, d, _ in candidates}) < args.days:
+        for doctor_id, schedule in schedules.items():
+            if schedule.works_on(giorno):
+                candidates += [(doctor_id, giorno, slot) for slot in schedule.slot_times]
+        giorno += timedelta(days=1)
+
+    outcomes = Counter()
+    lock = threading.Lock()
+    remaining = [args.attempts]
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            doctor_id, giorno, ora = rng.choice(candidates)
+            patient_id = rng.choice(patient_ids)
+            appointment = AppointmentCreate(
+                doctor_id=doctor_id,
+                patient_id=patient_id,
+                room_id=rng.choice(room_ids) if room_ids and rng.random() < 0.5 else None,
+                data_appuntamento=giorno,
+                ora_inizio=ora,
+                durata_minuti=rng.choice([30, 45, 60]),
+                tipo_visita="Stress test"
+            )
+            db = SessionLocal()
+            try:
+                create_appointment(appointment, SimpleNamespace(id=patient_id, user_type="patient"), db)
+                outcome = "creata"
+            except HTTPException as error:
+                outcome = f"{error.status_code} {error.detail}"
+            except Exception as error:
+                outcome = f"errore {type(error).__name__}"
+            finally:
+                db.close()
+            with lock:
+                outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(args.seed + i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Verifica: nessuna sovrapposizione tra appuntamenti attivi per medico e per sala
+    days = sorted({d for _, d, _ in candidates})
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(models.Appointment.doctor_id, models.Appointment.room_id, models.Appointment.data_appuntamento,
+                   models.Appointment.ora_inizio, models.Appointment.durata_minuti).where(
+                models.Appointment.data_appuntamento >= days[0],
+                models.Appointment.data_appuntamento <= days[-1],
+                models.Appointment.stato != 'cancellato'
+            )
+        ).all()
+    by_resource = {}
+    for doctor_id, room_id, giorno, ora, durata in rows:
+        interval = appointment_interval(ora, durata)
+        by_resource.setdefault(("medico", doctor_id, giorno), []).append(interval)
+        if room_id:
+            by_resource.setdefault(("sala", room_id, giorno), []).append(interval)
+    overlapping = sum(
+        1
+        for intervals in by_resource.values()
+        for i, a in enumerate(intervals)
+        for b in intervals[i + 1:]
+        if overlaps(a, b)
+    )
+
+    print(f"Thread: {args.threads}, tentativi: {args.attempts}, tempo: {elapsed:.2f}s")
+    print(f"Tentativi/s: {args.attempts / elapsed:.1f}, prenotazioni/s: {outcomes['creata'] / elapsed:.1f}")
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome}: {count}")
+    print(f"Sovrapposizioni tra appuntamenti attivi: {overlapping}")
+    return 1 if overlapping else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+from typing import Dict, NamedTuple
+
+
+class Scale(NamedTuple):
+    doctors: int
+    patients: int
+    months: int
+    waiting: int
+
+
+SCALES: Dict[str, Scale] = {
+    "small": Scale(doctors=10, patients=1_000, months=3, waiting=100),
+    "medium": Scale(doctors=50, patients=20_000, months=12, waiting=1_000),
+    "large": Scale(doctors=200, patients=200_000, months=24, waiting=10_000),
+}
@@ -0,0 +1,128 @@
+"""Confronto tra serializzazione di FastAPI e percorso veloce delle liste.
+
+Per liste di appuntamenti e pazienti da 1k e 10k righe misura il tempo CPU
+per riga di:
+  - fastapi: validazione con response_model, jsonable_encoder e JSONResponse
+    (quello che FastAPI fa quando una route restituisce oggetti ORM);
+  - fast: RowSerializer + FastJSONResponse (services/serialization.py).
+Riporta anche la dimensione del corpo e quella compressa con gzip.
+Le righe sono oggetti ORM transienti: il database non è coinvolto.
+
+Uso:
+    python -m backend.benchmarks.serialization --rows 1000,10000 --repeat 5
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+import time
+from datetime import date, datetime, time as clock, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from backend.app import models
+from backend.app.schemas import appointment as appointment_schemas
+from backend.app.schemas import patient as patient_schemas
+from backend.app.services.serialization import FastJSONResponse, RowSerializer, orjson
+
+
+def make_appointments(count: int) -> list:
+    created = datetime(2024, 1, 1, 8, 30, 15)
+    return [
+        models.Appointment(
+            id=i + 1,
+            patient_id=i % 997 + 1,
+            doctor_id=i % 50 + 1,
+            room_id=i % 20 + 1 if i % 3 else None,
+            data_appuntamento=date(2024, 1, 1) + timedelta(days=i % 365),
+            ora_inizio=clock(8 + i % 10, (i % 4) * 15),
+            durata_minuti=30,
+            tipo_visita="Visita di controllo",
+            stato="programmato",
+            note="Portare esami precedenti" if i % 2 else None,
+            motivo_cancellazione=None,
+            created_at=created,
+            updated_at=created,
+        )
+        for i in range(count)
+    ]
+
+
+def make_patients(count: int) -> list:
+    created = datetime(2024, 1, 1, 8, 30, 15)
+    return [
+        models.Patient(
+            id=i + 1,
+            nome="Giulia",
+            cognome=f"Rossi{i}",
+            codice_fiscale=f"RSSGLI80A01H501{i % 10}",
+            data_nascita=date(1980, 1, 1) + timedelta(days=i % 10000),
+            email=f"paziente{i}@example.com",
+            telefono="+39 333 1234567",
+            indirizzo="Via Roma 1",
+            citta="Milano",
+            cap="20100",
+            contatto_emergenza_nome=None,
+            contatto_emergenza_telefono=None,
+            note_mediche="Allergia alla penicillina" if i % 5 == 0 else None,
+            attivo=True,
+            created_at=created,
+        )
+        for i in range(count)
+    ]
+
+
+def fastapi_body(field, rows) -> bytes:
+    content = asyncio.run(serialize_response(field=field, response_content=rows, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def fast_body(serializer: RowSerializer, rows) -> bytes:
+    return FastJSONResponse(serializer.many(rows)).body
+
+
+def cpu_per_row(render, rows, repeat: int) -> float:
+    """Miglior tempo CPU per riga (µs) su repeat esecuzioni"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        render(rows)
+        best = min(best, time.process_time() - started)
+    return best / len(rows) * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.serialization")
+    parser.add_argument("--rows", default="1000,10000", help="dimensioni delle liste, separate da virgola")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    sizes: List[int] = [int(size) for size in args.rows.split(",")]
+
+    cases = [
+        ("appointments", appointment_schemas.Appointment, make_appointments),
+        ("patients", patient_schemas.Patient, make_patients),
+    ]
+    print(f"Encoder JSON: {'orjson ' + orjson.__version__ if orjson else 'json (libreria standard)'}")
+    print(f"{'lista':<14}{'righe':>7}{'fastapi µs/riga':>17}{'fast µs/riga':>14}{'speedup':>9}"
+          f"{'corpo':>11}{'gzip':>10}")
+    for name, schema, factory in cases:
+        field = create_response_field(name=f"Response_{name}", type_=List[schema])
+        serializer = RowSerializer(schema)
+        for size in sizes:
+            rows = factory(size)
+            # I due percorsi devono produrre lo stesso JSON
+            assert json.loads(fastapi_body(field, rows[:50])) == json.loads(fast_body(serializer, rows[:50]))
+            baseline = cpu_per_row(lambda r: fastapi_body(field, r), rows, args.repeat)
+            fast = cpu_per_row(lambda r: fast_body(serializer, r), rows, args.repeat)
+            body = fast_body(serializer, rows)
+            print(f"{name:<14}{size:>7}{baseline:>17.2f}{fast:>14.2f}{baseline / fast:>8.1f}x"
+                  f"{len(body):>11}{len(gzip.compress(body, 6)):>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
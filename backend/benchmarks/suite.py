@@ -0,0 +1,267 @@
+"""Esecuzione di una singola scala (in un processo dedicato).
+
+DATABASE_URL deve essere impostata prima di importare backend.database:
+per questo __main__ lancia un sottoprocesso per ogni scala.
+
+Dopo il riscaldamento le letture servite dalle cache in memoria misurano
+solo il caso caldo; le varianti "_cold" svuotano le cache prima di ogni
+iterazione (fuori dal tempo misurato). Le scritture prenotano a ogni
+iterazione uno slot diverso, oltre l'orizzonte dei dati generati.
+"""
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, NamedTuple, Union
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, insert, select
+
+from backend import generate_data
+from backend.app import models
+from backend.app.auth.auth_service import create_access_token, user_cache
+from backend.app.services.availability import availability_cache
+from backend.app.services.reference_cache import REFERENCE_KINDS, reference_cache
+from backend.app.services.scheduling import DoctorSchedule
+from backend.benchmarks.scales import Scale
+from backend.database import engine
+from backend.main import app
+
+
+class Endpoint(NamedTuple):
+    nome: str
+    method: str
+    url: str
+    headers: Dict[str, str]
+    # Un dict, oppure una funzione che restituisce un corpo nuovo a ogni richiesta
+    json: Union[dict, Callable[[], dict]] = None
+    iterations: int = None
+    # Svuota le cache in memoria prima di ogni iterazione misurata
+    cold: bool = False
+
+
+class StatementCounter:
+    """Conta le istruzioni SQL eseguite sull'engine"""
+
+    def __init__(self, bind):
+        self.count = 0
+        event.listen(bind, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def seed(scale: Scale, seed_value: int) -> None:
+    """Popola il database se vuoto (generate_data + lista d'attesa)"""
+    generate_data.upgrade(engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count(models.Doctor.id))).scalar():
+            return
+
+    generate_data.main([
+        "--doctors", str(scale.doctors),
+        "--patients", str(scale.patients),
+        "--months", str(scale.months),
+        "--seed", str(seed_value),
+    ])
+
+    rng = random.Random(seed_value)
+    with engine.begin() as conn:
+        patient_ids = conn.execute(select(models.Patient.id)).scalars().all()
+        doctors = conn.execute(select(models.Doctor.id, models.Doctor.specializzazione)).all()
+        rows = []
+        for _ in range(scale.waiting):
+            doctor_id, specializzazione = rng.choice(doctors)
+            rows.append({
+                "patient_id": rng.choice(patient_ids),
+                "doctor_id": doctor_id if rng.random() < 0.5 else None,
+                "specializzazione": specializzazione,
+                "tipo_visita": rng.choice(generate_data.TIPI_VISITA),
+                "priorita": rng.choice(['bassa', 'media', 'alta', 'urgente']),
+            })
+        for batch in generate_data._batches(rows):
+            conn.execute(insert(models.WaitingList), batch)
+
+
+def clear_caches() -> None:
+    """Riporta a freddo le cache in memoria (disponibilità, dati di riferimento, utenti)"""
+    availability_cache.clear()
+    for kind in REFERENCE_KINDS:
+        reference_cache.invalidate(kind)
+    user_cache.clear()
+
+
+def free_slots(doctor, start: date) -> Iterator[tuple]:
+    """(data, ora) liberi del medico da start in poi, uno per prenotazione"""
+    schedule = DoctorSchedule.from_doctor(doctor)
+    with engine.connect() as conn:
+        booked = set(conn.execute(
+            select(models.Appointment.data_appuntamento, models.Appointment.ora_inizio).where(
+                models.Appointment.doctor_id == doctor.id,
+                models.Appointment.data_appuntamento >= start,
+                models.Appointment.stato != 'cancellato'
+            )
+        ).all())
+    giorno = start
+    while True:
+        if schedule.works_on(giorno):
+            for ora in schedule.slot_times:
+                if (giorno, ora) not in booked:
+                    yield giorno, ora
+        giorno += timedelta(days=1)
+
+
+def booking_payloads(doctor, patient_id: int, start: date, size: int = None) -> Callable[[], dict]:
+    """Corpi per POST /api/appointments/ (size=None) o /bulk (size elementi) su slot sempre nuovi"""
+    slots = free_slots(doctor, start)
+
+    def item() -> dict:
+        giorno, ora = next(slots)
+        return {
+            "doctor_id": doctor.id,
+            "patient_id": patient_id,
+            "data_appuntamento": str(giorno),
+            "ora_inizio": str(ora),
+            "durata_minuti": 30,
+            "tipo_visita": "Benchmark",
+        }
+
+    if size is None:
+        return item
+    return lambda: {"appointments": [item() for _ in range(size)]}
+
+
+def endpoints(iterations: int) -> List[Endpoint]:
+    """Un percorso rappresentativo per ogni router di backend/main.py"""
+    with engine.connect() as conn:
+        patient_id, patient_email, patient_cognome = conn.execute(
+            select(models.Patient.id, models.Patient.email, models.Patient.cognome).join(
+                models.Appointment, models.Appointment.patient_id == models.Patient.id
+            ).group_by(models.Patient.id).order_by(func.count(models.Appointment.id).desc()).limit(1)
+        ).one()
+        booking_doctor = conn.execute(select(models.Doctor).limit(1)).one()
+        doctor_id, doctor_email, specializzazione = (
+            booking_doctor.id, booking_doctor.email, booking_doctor.specializzazione
+        )
+        room_id = conn.execute(select(models.Room.id).limit(1)).scalar()
+        appointment_id = conn.execute(
+            select(models.Appointment.id).where(models.Appointment.doctor_id == doctor_id).limit(1)
+        ).scalar()
+
+    today = date.today()
+    in_30 = today + timedelta(days=30)
+    patient = {"Authorization": "Bearer " + create_access_token({"sub": str(patient_id), "type": "patient"})}
+    doctor = {"Authorization": "Bearer " + create_access_token({"sub": str(doctor_id), "type": "doctor"})}
+    login_iterations = max(3, iterations // 10)
+    # Oltre i mesi generati da generate_data: prenotazioni e lotti non trovano conflitti
+    booking_start = today + timedelta(days=400)
+    password = generate_data.DEFAULT_PASSWORD
+
+    return [
+        Endpoint("auth.login_patient", "POST", "/api/auth/login/patient", {},
+                 {"email": patient_email, "password": password}, login_iterations),
+        Endpoint("auth.login_doctor", "POST", "/api/auth/login/doctor", {},
+                 {"email": doctor_email, "password": password}, login_iterations),
+        Endpoint("auth.me", "GET", "/api/auth/me", patient),
+        Endpoint("auth.me_cold", "GET", "/api/auth/me", patient, cold=True),
+        Endpoint("doctors.list", "GET", "/api/doctors/", {}),
+        Endpoint("doctors.list_cold", "GET", "/api/doctors/", {}, cold=True),
+        Endpoint("doctors.detail", "GET", f"/api/doctors/{doctor_id}", {}),
+        Endpoint("doctors.specialization", "GET", f"/api/doctors/specialization/{specializzazione}", {}),
+        Endpoint("doctors.availability", "GET",
+                 f"/api/doctors/{doctor_id}/availability?start_date={today}&end_date={in_30}", {}),
+        Endpoint("doctors.availability_cold", "GET",
+                 f"/api/doctors/{doctor_id}/availability?start_date={today}&end_date={in_30}", {}, cold=True),
+        Endpoint("patients.list", "GET", "/api/patients/", doctor),
+        Endpoint("patients.search", "GET", f"/api/patients/?search={patient_cognome[:3]}", doctor),
+        Endpoint("patients.detail", "GET", f"/api/patients/{patient_id}", doctor),
+        Endpoint("patients.history", "GET", f"/api/patients/{patient_id}/history", doctor),
+        Endpoint("appointments.list", "GET", "/api/appointments/", doctor),
+        Endpoint("appointments.detailed", "GET", f"/api/appointments/detailed?patient_id={patient_id}", patient),
+        Endpoint("appointments.detailed_day", "GET",
+                 f"/api/appointments/detailed?doctor_id={doctor_id}&data={today}", doctor),
+        Endpoint("appointments.available_slots", "GET",
+                 f"/api/appointments/available-slots?specializzazione={specializzazione}"
+                 f"&start_date={today}&end_date={in_30}", {}),
+        Endpoint("appointments.available_slots_cold", "GET",
+                 f"/api/appointments/available-slots?specializzazione={specializzazione}"
+                 f"&start_date={today}&end_date={in_30}", {}, cold=True),
+        Endpoint("appointments.available_slots_all", "GET",
+                 f"/api/appointments/available-slots?start_date={today}&end_date={in_30}", {}),
+        Endpoint("appointments.available_slots_all_cold", "GET",
+                 f"/api/appointments/available-slots?start_date={today}&end_date={in_30}", {}, cold=True),
+        Endpoint("appointments.create", "POST", "/api/appointments/", patient,
+                 booking_payloads(booking_doctor, patient_id, booking_start)),
+        Endpoint("appointments.bulk", "POST", "/api/appointments/bulk", doctor,
+                 booking_payloads(booking_doctor, patient_id, booking_start + timedelta(days=200), size=20),
+                 iterations=max(3, iterations // 5)),
+        Endpoint("appointments.waiting_list", "GET", "/api/appointments/waiting-list", doctor),
+        Endpoint("appointments.export", "GET", f"/api/appointments/export?data_from={today - timedelta(days=90)}",
+                 doctor, iterations=max(3, iterations // 5)),
+        Endpoint("appointments.detail", "GET", f"/api/appointments/{appointment_id}", doctor),
+        Endpoint("rooms.list", "GET", "/api/rooms/", {}),
+        Endpoint("rooms.list_cold", "GET", "/api/rooms/", {}, cold=True),
+        Endpoint("rooms.detail", "GET", f"/api/rooms/{room_id}", {}),
+        Endpoint("rooms.availability", "GET", f"/api/rooms/{room_id}/availability?data={today}", {}),
+        Endpoint("rooms.availability_all", "GET", f"/api/rooms/availability?data={today}", {}),
+    ]
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(client: TestClient, counter: StatementCounter, endpoint: Endpoint, iterations: int) -> dict:
+    n = endpoint.iterations or iterations
+    payload: Callable = endpoint.json if callable(endpoint.json) else lambda: endpoint.json
+    request: Callable = lambda body: client.request(
+        endpoint.method, endpoint.url, headers=endpoint.headers, json=body
+    )
+
+    # Una richiesta di riscaldamento (cache, piani di query)
+    warmup = request(payload())
+    if warmup.status_code >= 400:
+        return {"error": warmup.status_code, "detail": warmup.text[:200]}
+
+    latencies = []
+    statements = 0
+    response_bytes = 0
+    elapsed = 0.0
+    for _ in range(n):
+        # Preparazione fuori dal tempo misurato
+        if endpoint.cold:
+            clear_caches()
+        body = payload()
+        before = counter.count
+        t0 = time.perf_counter()
+        response = request(body)
+        latency = time.perf_counter() - t0
+        elapsed += latency
+        latencies.append(latency * 1000)
+        statements += counter.count - before
+        response_bytes += len(response.content)
+
+    latencies.sort()
+    return {
+        "iterations": n,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(n / elapsed, 1),
+        "sql_statements": round(statements / n, 2),
+        "response_bytes": response_bytes // n,
+    }
+
+
+def run(scale: Scale, iterations: int, seed_value: int, only: List[str] = None) -> Dict[str, dict]:
+    seed(scale, seed_value)
+    counter = StatementCounter(engine)
+    results = {}
+    with TestClient(app) as client:
+        for endpoint in endpoints(iterations):
+            if only and not any(endpoint.nome.startswith(prefix) for prefix in only):
+                continue
+            results[endpoint.nome] = measure(client, counter, endpoint, iterations)
+    return results
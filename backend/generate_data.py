@@ -1,217 +1,375 @@
+"""Generazione dati di test.
+
+Uso:
+    python -m backend.generate_data
+    python -m backend.generate_data --doctors 500 --patients 1_000_000 --months 24 --seed 42 --workers 4
+
+Le righe sono scritte con insert Core a blocchi (senza oggetti ORM) e gli
+appuntamenti di ogni medico non si sovrappongono, né tra loro né nelle sale.
+"""
+import argparse
 import random
-from datetime import datetime, date, time, timedelta
+import time as clock
+from datetime import date, time, timedelta
+from multiprocessing import Pool
 from faker import Faker
-from backend.database import SessionLocal
+from sqlalchemy import func, insert, or_, select
+from backend.database import engine
 from backend.app import models
 from backend.app.auth.auth_service import get_password_hash
-
-fake = Faker('it_IT')
+from backend.app.models.patient_search_token import token_rows
+from backend.app.models.appointment_slot import SLOT_UNIT_MINUTES, slot_rows
+from backend.app.services.scheduling import SLOT_MINUTES, DoctorSchedule, iter_days
+from backend.migrations import upgrade
 
 # Password di default per tutti gli utenti
 DEFAULT_PASSWORD = "password123"
 
-def generate_codice_fiscale():
-    """Genera un codice fiscale fittizio"""
-    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    digits = '0123456789'
-    return ''.join(random.choices(letters, k=6)) + \
-           ''.join(random.choices(digits, k=2)) + \
-           random.choice(letters) + \
-           ''.join(random.choices(digits, k=2)) + \
-           random.choice(letters) + \
-           ''.join(random.choices(digits, k=3)) + \
-           random.choice(letters)
-
-def generate_doctors(db):
-    """Genera medici con diverse specializzazioni"""
-    specializzazioni = [
-        'Cardiologia', 'Dermatologia', 'Ortopedia', 'Pediatria',
-        'Ginecologia', 'Neurologia', 'Oculistica', 'Psichiatria',
-        'Medicina Generale', 'Endocrinologia'
-    ]
-    
-    giorni_options = [
-        'lun,mar,mer,gio,ven',
-        'lun,mer,ven',
-        'mar,gio',
-        'lun,mar,gio,ven'
+BATCH_SIZE = 5000
+
+SPECIALIZZAZIONI = [
+    'Cardiologia', 'Dermatologia', 'Ortopedia', 'Pediatria',
+    'Ginecologia', 'Neurologia', 'Oculistica', 'Psichiatria',
+    'Medicina Generale', 'Endocrinologia'
+]
+
+GIORNI_OPTIONS = [
+    'lun,mar,mer,gio,ven',
+    'lun,mer,ven',
+    'mar,gio',
+    'lun,mar,gio,ven'
+]
+
+TIPI_VISITA = [
+    'Visita di controllo', 'Prima visita', 'Visita specialistica',
+    'Visita urgente', 'Controllo post-operatorio', 'Consulto',
+    'Esame diagnostico', 'Visita di routine'
+]
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def generate_codice_fiscale(rng: random.Random, n: int) -> str:
+    """Codice fiscale fittizio; le 7 cifre codificano n, quindi è unico fino a 10 milioni"""
+    digits = f"{n % 10_000_000:07d}"
+    return ''.join(rng.choices(LETTERS, k=6)) + digits[:2] + \
+        rng.choice(LETTERS) + digits[2:4] + \
+        rng.choice(LETTERS) + digits[4:] + \
+        rng.choice(LETTERS)
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def generate_rooms(conn, n: int):
+    """Crea le sale visita se il database non ne ha"""
+    room_ids = conn.execute(select(models.Room.id)).scalars().all()
+    if room_ids:
+        return room_ids
+
+    first_id = _next_id(conn, models.Room)
+    rows = [
+        {
+            "id": first_id + i,
+            "numero": str(100 + i + 1),
+            "nome": f"Ambulatorio {i + 1}",
+            "piano": i // 5,
+            "capienza": 1,
+            "attiva": True,
+        }
+        for i in range(n)
     ]
-    
+    conn.execute(insert(models.Room), rows)
+    return [row["id"] for row in rows]
+
+
+def generate_doctors(conn, n: int, rng: random.Random, fake: Faker, password_hash: str):
+    """Genera medici con diverse specializzazioni"""
+    first_id = _next_id(conn, models.Doctor)
     doctors = []
-    password_hash = get_password_hash(DEFAULT_PASSWORD)
-    
-    for i, spec in enumerate(specializzazioni):
-        doctor = models.Doctor(
-            nome=fake.first_name(),
-            cognome=fake.last_name(),
-            specializzazione=spec,
-            email=f"dott.{fake.user_name()}@clinica.it",
-            password_hash=password_hash,
-            telefono=fake.phone_number(),
-            orario_inizio=time(9, 0),
-            orario_fine=time(18, 0) if i % 2 == 0 else time(17, 0),
-            giorni_disponibili=random.choice(giorni_options)
-        )
-        doctors.append(doctor)
-        db.add(doctor)
-    
-    db.commit()
-    print(f"✓ Creati {len(doctors)} medici")
-    print(f"  Email esempio: {doctors[0].email}")
-    print(f"  Password per tutti: {DEFAULT_PASSWORD}")
+    for i in range(n):
+        doctors.append({
+            "id": first_id + i,
+            "nome": fake.first_name(),
+            "cognome": fake.last_name(),
+            "specializzazione": SPECIALIZZAZIONI[i % len(SPECIALIZZAZIONI)],
+            "email": f"dott.{fake.user_name()}.{first_id + i}@clinica.it",
+            "password_hash": password_hash,
+            "telefono": fake.phone_number(),
+            "orario_inizio": time(9, 0),
+            "orario_fine": time(18, 0) if i % 2 == 0 else time(17, 0),
+            "giorni_disponibili": rng.choice(GIORNI_OPTIONS),
+            "attivo": True,
+        })
+
+    for batch in _batches(doctors):
+        conn.execute(insert(models.Doctor), batch)
     return doctors
 
-def generate_patients(db, n=100):
-    """Genera pazienti con dati completi"""
+
+def _patient_chunk(args):
+    """Genera un blocco di pazienti (eseguibile in un processo separato)"""
+    first_id, count, seed, password_hash = args
+    fake = Faker('it_IT')
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+
     patients = []
-    password_hash = get_password_hash(DEFAULT_PASSWORD)
-    
-    for _ in range(n):
-        patient = models.Patient(
-            nome=fake.first_name(),
-            cognome=fake.last_name(),
-            codice_fiscale=generate_codice_fiscale(),
-            data_nascita=fake.date_of_birth(minimum_age=18, maximum_age=90),
-            email=fake.email(),
-            password_hash=password_hash,
-            telefono=fake.phone_number(),
-            indirizzo=fake.street_address(),
-            citta=fake.city(),
-            cap=fake.postcode(),
-            contatto_emergenza_nome=fake.name(),
-            contatto_emergenza_telefono=fake.phone_number(),
-            note_mediche=fake.text(max_nb_chars=200) if random.random() > 0.7 else None
-        )
-        patients.append(patient)
-        db.add(patient)
-    
-    db.commit()
-    print(f"Creati {len(patients)} pazienti")
-    print(f"Email esempio: {patients[0].email}")
-    print(f"Password per tutti: {DEFAULT_PASSWORD}")
+    for patient_id in range(first_id, first_id + count):
+        patients.append({
+            "id": patient_id,
+            "nome": fake.first_name(),
+            "cognome": fake.last_name(),
+            "codice_fiscale": generate_codice_fiscale(rng, patient_id),
+            "data_nascita": fake.date_of_birth(minimum_age=18, maximum_age=90),
+            "email": f"{fake.user_name()}.{patient_id}@{fake.free_email_domain()}",
+            "password_hash": password_hash,
+            "telefono": fake.phone_number(),
+            "indirizzo": fake.street_address(),
+            "citta": fake.city(),
+            "cap": fake.postcode(),
+            "contatto_emergenza_nome": fake.name(),
+            "contatto_emergenza_telefono": fake.phone_number(),
+            "note_mediche": fake.text(max_nb_chars=200) if rng.random() > 0.7 else None,
+            "attivo": True,
+        })
     return patients
 
-def generate_appointments(db, doctors, patients, rooms):
-    """Genera appuntamenti realistici degli ultimi 3 mesi"""
-    tipi_visita = [
-        'Visita di controllo', 'Prima visita', 'Visita specialistica',
-        'Visita urgente', 'Controllo post-operatorio', 'Consulto',
-        'Esame diagnostico', 'Visita di routine'
+
+def generate_patients(conn, n: int, seed: int, workers: int, password_hash: str):
+    """Genera pazienti con dati completi; restituisce l'intervallo di id creati"""
+    first_id = _next_id(conn, models.Patient)
+    chunks = [
+        (start, min(BATCH_SIZE, first_id + n - start), seed * 1_000_003 + start, password_hash)
+        for start in range(first_id, first_id + n, BATCH_SIZE)
     ]
-    
-    stati_probabilities = {
-        'completato': 0.7,
-        'programmato': 0.25,
-        'cancellato': 0.05
+
+    def insert_chunk(patients):
+        conn.execute(insert(models.Patient), patients)
+        # Gli insert Core non passano dagli eventi ORM: l'indice di ricerca si scrive qui
+        tokens = [
+            row
+            for p in patients
+            for row in token_rows(p["id"], p["nome"], p["cognome"], p["codice_fiscale"])
+        ]
+        conn.execute(insert(models.PatientSearchToken), tokens)
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            for patients in pool.imap(_patient_chunk, chunks):
+                insert_chunk(patients)
+    else:
+        for chunk in chunks:
+            insert_chunk(_patient_chunk(chunk))
+
+    return range(first_id, first_id + n)
+
+
+def _stato(giorno: date, today: date, rng: random.Random) -> str:
+    # Determina stato basato sulla data
+    if giorno < today:
+        return 'completato' if rng.random() < 0.93 else 'cancellato'
+    return 'programmato'
+
+
+def load_occupancy(conn, doctor_ids, start_date: date, end_date: date) -> dict:
+    """Occupazione già nel database (esecuzioni precedenti), per (risorsa, id, giorno).
+
+    Le bitmask seguono la griglia oraria assoluta (slot da SLOT_MINUTES dalla
+    mezzanotte): uno slot è occupato se lo è anche una sola delle sue unità.
+    Le sale sono condivise tra le esecuzioni, i medici solo se già presenti.
+    """
+    Slot = models.AppointmentSlot
+    rows = conn.execute(
+        select(Slot.risorsa, Slot.resource_id, Slot.data, Slot.unita).where(
+            Slot.data >= start_date,
+            Slot.data <= end_date,
+            or_(Slot.risorsa == 'sala', Slot.resource_id.in_(list(doctor_ids)))
+        )
+    )
+    occupied = {}
+    for risorsa, resource_id, giorno, unita in rows:
+        key = (risorsa, resource_id, giorno)
+        occupied[key] = occupied.get(key, 0) | 1 << (unita * SLOT_UNIT_MINUTES // SLOT_MINUTES)
+    return occupied
+
+
+def iter_appointments(doctors, patient_ids, room_ids, start_date: date, end_date: date,
+                      rng: random.Random, sentences, occupied: dict = None):
+    """Appuntamenti senza sovrapposizioni per medico e per sala.
+
+    Per ogni giornata si tiene una bitmask degli slot occupati del medico e
+    una per ogni sala: un appuntamento viene piazzato solo se tutti i suoi
+    slot sono liberi; la sala solo se è libera per l'intero intervallo.
+    occupied (load_occupancy) contiene gli slot già presi nel database.
+    """
+    today = date.today()
+    occupied = occupied or {}
+    room_busy = {
+        (resource_id, giorno): mask
+        for (risorsa, resource_id, giorno), mask in occupied.items() if risorsa == 'sala'
     }
-    
-    appointments = []
-    start_date = date.today() - timedelta(days=90)
-    end_date = date.today() + timedelta(days=30)
-    
-    # Genera appuntamenti per ogni medico
     for doctor in doctors:
-        giorni_map = {
-            'lun': 0, 'mar': 1, 'mer': 2, 'gio': 3, 'ven': 4, 'sab': 5, 'dom': 6
-        }
-        giorni_disponibili = [giorni_map[g] for g in doctor.giorni_disponibili.split(',')]
-        
-        current_date = start_date
-        while current_date <= end_date:
-            if current_date.weekday() in giorni_disponibili:
-                # Numero random di appuntamenti per giorno (3-7)
-                n_appointments = random.randint(3, 7)
-                
-                for _ in range(n_appointments):
-                    # Genera orario casuale nelle ore disponibili
-                    ora_inizio_dt = datetime.combine(date.today(), doctor.orario_inizio)
-                    ora_fine_dt = datetime.combine(date.today(), doctor.orario_fine)
-                    
-                    # Slot di 30 minuti
-                    total_slots = int((ora_fine_dt - ora_inizio_dt).total_seconds() / 1800)
-                    if total_slots > 0:
-                        slot = random.randint(0, total_slots - 1)
-                        ora = (ora_inizio_dt + timedelta(minutes=30 * slot)).time()
-                        
-                        # Determina stato basato sulla data
-                        if current_date < date.today():
-                            stato = random.choices(
-                                ['completato', 'cancellato'],
-                                weights=[0.93, 0.07]
-                            )[0]
-                        elif current_date == date.today():
-                            stato = 'programmato'
-                        else:
-                            stato = 'programmato'
-                        
-                        appointment = models.Appointment(
-                            doctor_id=doctor.id,
-                            patient_id=random.choice(patients).id,
-                            room_id=random.choice(rooms).id if random.random() > 0.1 else None,
-                            data_appuntamento=current_date,
-                            ora_inizio=ora,
-                            durata_minuti=random.choice([30, 45, 60]),
-                            tipo_visita=random.choice(tipi_visita),
-                            stato=stato,
-                            note=fake.sentence() if random.random() > 0.6 else None,
-                            motivo_cancellazione=fake.sentence() if stato == 'cancellato' else None
-                        )
-                        appointments.append(appointment)
-                        db.add(appointment)
-            
-            current_date += timedelta(days=1)
-    
-    db.commit()
-    print(f"✓ Creati {len(appointments)} appuntamenti")
-    return appointments
-
-def main():
+        schedule = DoctorSchedule(doctor["orario_inizio"], doctor["orario_fine"], doctor["giorni_disponibili"])
+        if not schedule.n_slots:
+            continue
+
+        for giorno in iter_days(start_date, end_date):
+            if not schedule.works_on(giorno):
+                continue
+
+            # Maschera del medico relativa al suo orario di inizio
+            busy = occupied.get(('medico', doctor["id"], giorno), 0) >> (schedule.start_minute // SLOT_MINUTES)
+            # Numero random di appuntamenti per giorno (3-7)
+            for _ in range(rng.randint(3, 7)):
+                durata = rng.choice([30, 45, 60])
+                width = -(-durata // SLOT_MINUTES)
+                slot = rng.randrange(schedule.n_slots)
+                mask = ((1 << width) - 1) << slot
+                if slot + width > schedule.n_slots or busy & mask:
+                    continue
+                busy |= mask
+
+                # Lo stato 'cancellato' libera lo slot nei dati reali, qui basta non sovrapporre
+                stato = _stato(giorno, today, rng)
+
+                room_id = None
+                if room_ids and rng.random() > 0.1:
+                    room_id = rng.choice(room_ids)
+                    # Le sale seguono la griglia oraria assoluta (slot dalla mezzanotte)
+                    room_mask = mask << (schedule.start_minute // SLOT_MINUTES)
+                    key = (room_id, giorno)
+                    if room_busy.get(key, 0) & room_mask:
+                        room_id = None
+                    else:
+                        room_busy[key] = room_busy.get(key, 0) | room_mask
+
+                yield {
+                    "doctor_id": doctor["id"],
+                    "patient_id": rng.choice(patient_ids),
+                    "room_id": room_id,
+                    "data_appuntamento": giorno,
+                    "ora_inizio": schedule.slot_times[slot],
+                    "durata_minuti": durata,
+                    "tipo_visita": rng.choice(TIPI_VISITA),
+                    "stato": stato,
+                    "note": rng.choice(sentences) if rng.random() > 0.6 else None,
+                    "motivo_cancellazione": rng.choice(sentences) if stato == 'cancellato' else None,
+                }
+
+
+def generate_appointments(conn, doctors, patient_ids, room_ids, months: int,
+                          rng: random.Random, fake: Faker):
+    """Genera appuntamenti degli ultimi `months` mesi e dei prossimi 30 giorni"""
+    start_date = date.today() - timedelta(days=30 * months)
+    end_date = date.today() + timedelta(days=30)
+    sentences = [fake.sentence() for _ in range(200)]
+
+    stati = {}
+    total = 0
+    next_id = _next_id(conn, models.Appointment)
+    occupied = load_occupancy(conn, [doctor["id"] for doctor in doctors], start_date, end_date)
+    rows = iter_appointments(doctors, patient_ids, room_ids, start_date, end_date, rng, sentences, occupied)
+    for batch in _batches(rows):
+        for row in batch:
+            row["id"] = next_id
+            next_id += 1
+        conn.execute(insert(models.Appointment), batch)
+        # Occupazione slot degli appuntamenti attivi (gli insert Core saltano gli eventi ORM)
+        slots = [
+            slot
+            for row in batch if row["stato"] != 'cancellato'
+            for slot in slot_rows(row["id"], row["doctor_id"], row["room_id"], row["data_appuntamento"],
+                                  row["ora_inizio"], row["durata_minuti"])
+        ]
+        if slots:
+            conn.execute(insert(models.AppointmentSlot), slots)
+        total += len(batch)
+        for row in batch:
+            stati[row["stato"]] = stati.get(row["stato"], 0) + 1
+    return total, stati
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Genera dati di test per il Sistema Gestione Studio Medico")
+    parser.add_argument("--doctors", type=int, default=10, help="numero di medici (default 10)")
+    parser.add_argument("--patients", type=int, default=100, help="numero di pazienti (default 100)")
+    parser.add_argument("--months", type=int, default=3, help="mesi di storico appuntamenti (default 3)")
+    parser.add_argument("--rooms", type=int, default=5, help="sale da creare se non ce ne sono (default 5)")
+    parser.add_argument("--seed", type=int, default=None, help="seme per dati riproducibili")
+    parser.add_argument("--workers", type=int, default=1, help="processi per la generazione dei pazienti")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Funzione principale per generare tutti i dati"""
+    args = parse_args(argv)
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+    rng = random.Random(seed)
+    fake = Faker('it_IT')
+    fake.seed_instance(seed)
+
     print("Generazione dati per Sistema Gestione Studio Medico")
     print("=" * 50)
-    
-    db = SessionLocal()
-    
+    print(f"Seme: {seed}")
+    started = clock.perf_counter()
+
+    upgrade(engine)
+    password_hash = get_password_hash(DEFAULT_PASSWORD)
+
     try:
-        # Ottieni le sale già create dallo schema
-        rooms = db.query(models.Room).all()
-        print(f"✓ Trovate {len(rooms)} sale visita")
-        
-        # Genera dati
-        print("Generazione medici...")
-        doctors = generate_doctors(db)
-        
+        with engine.begin() as conn:
+            room_ids = generate_rooms(conn, args.rooms)
+            print(f"✓ Sale visita: {len(room_ids)}")
+
+            print("Generazione medici...")
+            doctors = generate_doctors(conn, args.doctors, rng, fake, password_hash)
+            print(f"✓ Creati {len(doctors)} medici")
+            if doctors:
+                print(f"  Email esempio: {doctors[0]['email']}")
+
         print("Generazione pazienti...")
-        patients = generate_patients(db, n=100)
-        
+        with engine.begin() as conn:
+            patient_ids = generate_patients(conn, args.patients, seed, args.workers, password_hash)
+        print(f"✓ Creati {len(patient_ids)} pazienti")
+
         print("Generazione appuntamenti...")
-        appointments = generate_appointments(db, doctors, patients, rooms)
-        
+        with engine.begin() as conn:
+            total, stati = generate_appointments(
+                conn, doctors, patient_ids, room_ids, args.months, rng, fake
+            ) if doctors and patient_ids else (0, {})
+
         # Statistiche finali
         print("" + "=" * 50)
         print("RIEPILOGO")
         print("=" * 50)
         print(f"Medici creati: {len(doctors)}")
-        print(f"Pazienti creati: {len(patients)}")
-        print(f"Sale visita: {len(rooms)}")
-        print(f"Appuntamenti creati: {len(appointments)}")
-        
-        # Statistiche appuntamenti
-        stati = {}
-        for apt in appointments:
-            stati[apt.stato] = stati.get(apt.stato, 0) + 1
-        
+        print(f"Pazienti creati: {len(patient_ids)}")
+        print(f"Sale visita: {len(room_ids)}")
+        print(f"Appuntamenti creati: {total}")
+
         print("Appuntamenti per stato:")
         for stato, count in stati.items():
             print(f"  - {stato}: {count}")
-        
-        print("Generazione completata con successo!")
-        
+
+        print(f"Password per tutti: {DEFAULT_PASSWORD}")
+        print(f"Generazione completata con successo in {clock.perf_counter() - started:.1f}s!")
+
     except Exception as e:
         print(f"Errore durante la generazione: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
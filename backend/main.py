@@ -1,6 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from backend.app.routers import doctors, patients, appointments, rooms, auth
+from backend.database import DATABASE_MODE
+from backend.app.services.availability import availability_cache
+from backend.app.auth.auth_service import user_cache
+from backend.app.services.reference_cache import reference_cache
+from backend.app.services.read_routing import recent_writes
+from backend.app.services.metrics import MetricsMiddleware, render_metrics
 
 # Inizializza FastAPI
 app = FastAPI(
@@ -22,12 +30,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Compressione gzip negoziata con Accept-Encoding, solo per i corpi più grandi
+GZIP_MINIMUM_SIZE = 1024
+
+# Risposte in streaming: gzip tratterrebbe gli eventi SSE e i blocchi dell'export
+# (NDJSON/CSV) nel buffer del compressore, ritardando i primi byte
+GZIP_EXCLUDED_PATHS = {"/api/appointments/availability/stream", "/api/appointments/export"}
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in GZIP_EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+# Metriche per route e budget di query (gli eventi SQL sono registrati in backend/database.py)
+app.add_middleware(MetricsMiddleware)
+
 # Router Auth
 # Nota: i path dentro auth.router NON devono avere il prefisso /api/auth
 app.include_router(auth.router, prefix="/api/auth", tags=["Autenticazione"])
 
+# Modalità asincrona: le letture più frequenti sono servite da AsyncSession.
+# Vanno registrate prima dei router sincroni, che hanno gli stessi path.
+if DATABASE_MODE == "async":
+    from backend.app.routers import appointments_async, patients_async
+    app.include_router(appointments_async.router, prefix="/api/appointments", tags=["Appuntamenti"])
+    app.include_router(patients_async.router, prefix="/api/patients", tags=["Pazienti"])
+
 # Altri router
 app.include_router(doctors.router, prefix="/api/doctors", tags=["Medici"])
 app.include_router(patients.router, prefix="/api/patients", tags=["Pazienti"])
@@ -46,4 +81,19 @@ def read_root():
 # Health check
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+# Statistiche cache in-process (disponibilità, utenti autenticati, dati di riferimento, scritture recenti)
+@app.get("/health/cache")
+def cache_stats():
+    return {
+        "availability": availability_cache.stats(),
+        "users": user_cache.stats(),
+        "reference": reference_cache.stats(),
+        "read_your_writes": recent_writes.stats()
+    }
+
+# Metriche in formato testo Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
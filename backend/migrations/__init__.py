@@ -0,0 +1,9 @@
+"""Migrazioni versionate dello schema.
+
+Sostituiscono l'import manuale di database/schema.sql: ogni passo in
+steps.MIGRATIONS viene applicato una sola volta e registrato nella tabella
+schema_migrations. Uso: python -m backend.migrations [upgrade|status|check]
+"""
+from backend.migrations.runner import applied_versions, pending_migrations, upgrade
+
+__all__ = ["applied_versions", "pending_migrations", "upgrade"]
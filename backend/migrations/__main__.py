@@ -0,0 +1,36 @@
+import sys
+
+from backend.database import engine
+from backend.migrations.explain import check_index_usage
+from backend.migrations.runner import applied_versions, pending_migrations, upgrade
+from backend.migrations.steps import DoubleBookingError
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "upgrade"
+
+    if command == "upgrade":
+        try:
+            applied = upgrade(engine, verbose=True)
+        except DoubleBookingError as error:
+            print(f"✗ {error}")
+            return 1
+        print(f"Migrazioni applicate: {len(applied)}")
+    elif command == "status":
+        print(f"Versioni applicate: {sorted(applied_versions(engine))}")
+        for migration in pending_migrations(engine):
+            print(f"  da applicare: {migration.version:04d} {migration.descrizione}")
+    elif command == "check":
+        checks = check_index_usage()
+        for check in checks:
+            print(f"{'✓' if check.ok else '✗'} {check.nome}: {check.piano}")
+        if not all(check.ok for check in checks):
+            return 1
+    else:
+        print("Uso: python -m backend.migrations [upgrade|status|check]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
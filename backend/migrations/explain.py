@@ -0,0 +1,79 @@
+"""Verifica con EXPLAIN QUERY PLAN (SQLite) che le query calde usino gli indici.
+
+SQLite fa da stand-in del database reale: lo schema viene creato con le
+migrazioni e per ogni query si controlla che il piano nomini l'indice atteso.
+"""
+from datetime import date, time
+from typing import List, NamedTuple
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.engine import Engine
+
+from backend.app import models
+from backend.app.routers.patients import history_statements
+from backend.app.services.availability import busy_intervals_statement
+from backend.app.services.booking import appointment_interval, conflict_statement
+from backend.migrations.runner import upgrade
+
+
+class PlanCheck(NamedTuple):
+    nome: str
+    indice: str
+    piano: str
+
+    @property
+    def ok(self) -> bool:
+        return self.indice in self.piano
+
+
+def hot_queries():
+    """(nome, statement, indice atteso) per le query più frequenti"""
+    giorno = date(2024, 1, 15)
+    intervallo = appointment_interval(time(10, 30), 30)
+    Appointment = models.Appointment
+    WaitingList = models.WaitingList
+    return [
+        (
+            "intervalli occupati (ricerca slot)",
+            busy_intervals_statement([(1, giorno), (2, giorno)]),
+            "ix_appointments_doctor_data_stato",
+        ),
+        (
+            "conflitto medico",
+            conflict_statement(Appointment.doctor_id, 1, giorno, intervallo, exclude_id=7),
+            "ix_appointments_doctor_data_stato",
+        ),
+        (
+            "conflitto sala",
+            conflict_statement(Appointment.room_id, 1, giorno, intervallo),
+            "ix_appointments_room_data_ora",
+        ),
+        (
+            "storico paziente",
+            history_statements(1, 50, None, None, None)[0],
+            "ix_appointments_patient_data_ora",
+        ),
+        (
+            "lista d'attesa per priorità",
+            select(WaitingList.id).order_by(
+                WaitingList.priorita_rank.desc(), WaitingList.data_richiesta, WaitingList.id
+            ).limit(50),
+            "ix_waiting_list_coda",
+        ),
+    ]
+
+
+def check_index_usage(engine: Engine = None) -> List[PlanCheck]:
+    """Esegue le migrazioni su SQLite in memoria e restituisce i piani delle query calde"""
+    if engine is None:
+        engine = create_engine("sqlite://")
+        upgrade(engine)
+
+    checks = []
+    with engine.connect() as conn:
+        for nome, stmt, indice in hot_queries():
+            compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+            piano = " | ".join(row[-1] for row in rows)
+            checks.append(PlanCheck(nome, indice, piano))
+    return checks
@@ -0,0 +1,46 @@
+from typing import List, Set
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, TIMESTAMP, insert, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import func
+
+from backend.migrations.steps import MIGRATIONS, Migration
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("descrizione", String(255), nullable=False),
+    Column("applicata_il", TIMESTAMP, server_default=func.now()),
+)
+
+
+def applied_versions(engine: Engine) -> Set[int]:
+    """Versioni già applicate al database"""
+    if not inspect(engine).has_table(schema_migrations.name):
+        return set()
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def upgrade(engine: Engine, verbose: bool = False) -> List[Migration]:
+    """Applica in ordine le migrazioni mancanti, ognuna nella propria transazione"""
+    _metadata.create_all(engine, checkfirst=True)
+    applied = []
+    for migration in pending_migrations(engine):
+        with engine.begin() as conn:
+            migration.apply(conn)
+            conn.execute(insert(schema_migrations).values(
+                version=migration.version, descrizione=migration.descrizione
+            ))
+        applied.append(migration)
+        if verbose:
+            print(f"✓ {migration.version:04d} {migration.descrizione}")
+    return applied
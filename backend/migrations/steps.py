@@ -0,0 +1,187 @@
+"""Passi di migrazione, in ordine di versione.
+
+Ogni passo controlla lo stato reale del database con l'inspector, così può
+essere applicato sia a un database creato da zero (dove il baseline crea già
+tabelle e indici dai modelli) sia a uno esistente creato da schema.sql.
+"""
+from typing import Callable, Dict, List, NamedTuple
+
+from sqlalchemy import Table, and_, func, insert, inspect, or_, select, text
+from sqlalchemy.engine import Connection
+
+from backend.database import Base
+from backend.app import models
+from backend.app.models.patient_search_token import token_rows
+from backend.app.models.appointment_slot import slot_rows
+
+
+class Migration(NamedTuple):
+    version: int
+    descrizione: str
+    apply: Callable[[Connection], None]
+
+
+def _create_missing_indexes(conn: Connection, table: Table) -> None:
+    """Crea gli indici dichiarati nel modello che mancano nel database"""
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+    for index in sorted(table.indexes, key=lambda ix: ix.name):
+        if index.name not in existing:
+            index.create(conn)
+
+
+def _drop_indexes(conn: Connection, table: Table, names: List[str]) -> None:
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+    for name in names:
+        if name in existing:
+            if conn.dialect.name == "mysql":
+                conn.execute(text(f"DROP INDEX {name} ON {table.name}"))
+            else:
+                conn.execute(text(f"DROP INDEX {name}"))
+
+
+def baseline(conn: Connection) -> None:
+    """Crea le tabelle mancanti dai modelli (database nuovo)"""
+    Base.metadata.create_all(conn, checkfirst=True)
+
+
+def waiting_list_priority_rank(conn: Connection) -> None:
+    """Colonna generata priorita_rank e indici della coda per priorità"""
+    table = models.WaitingList.__table__
+    columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    if "priorita_rank" not in columns:
+        expression = table.c.priorita_rank.computed.sqltext
+        # SQLite non consente di aggiungere colonne generate STORED con ALTER TABLE
+        storage = "VIRTUAL" if conn.dialect.name == "sqlite" else "STORED"
+        conn.execute(text(
+            f"ALTER TABLE {table.name} ADD COLUMN priorita_rank SMALLINT "
+            f"GENERATED ALWAYS AS ({expression}) {storage}"
+        ))
+    _create_missing_indexes(conn, table)
+
+
+def appointment_composite_indexes(conn: Connection) -> None:
+    """Indici composti per conflitti, ricerca slot, sale e storico"""
+    table = models.Appointment.__table__
+    _create_missing_indexes(conn, table)
+    # Sostituiti dagli indici composti che iniziano con la stessa colonna
+    _drop_indexes(conn, table, ["ix_appointments_doctor_id", "ix_appointments_patient_id"])
+
+
+def patient_search_tokens(conn: Connection) -> None:
+    """Indice di ricerca pazienti, popolato con i pazienti esistenti"""
+    Token = models.PatientSearchToken
+    Token.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(Token.patient_id).limit(1)).first():
+        return
+
+    Patient = models.Patient
+    result = conn.execution_options(stream_results=True).execute(
+        select(Patient.id, Patient.nome, Patient.cognome, Patient.codice_fiscale)
+    )
+    for batch in result.partitions(1000):
+        rows = [token for patient in batch for token in token_rows(*patient)]
+        if rows:
+            conn.execute(insert(Token), rows)
+
+
+class DoubleBookingError(RuntimeError):
+    """Appuntamenti attivi sovrapposti: la tabella di occupazione non può rappresentarli"""
+
+    def __init__(self, conflicts: Dict[int, List[int]]):
+        self.conflicts = conflicts
+        dettaglio = ", ".join(
+            f"{appointment_id} (con {', '.join(map(str, holders))})"
+            for appointment_id, holders in sorted(conflicts.items())
+        )
+        super().__init__(
+            f"{len(conflicts)} appuntamenti attivi si sovrappongono ad altri: {dettaglio}. "
+            "Cancellarli o spostarli e rieseguire la migrazione."
+        )
+
+
+def _slot_holders(conn: Connection, appointment_id: int, rows: List[dict]) -> List[int]:
+    """Appuntamenti che occupano le unità di rows al posto di appointment_id"""
+    Slot = models.AppointmentSlot
+    units = {}
+    for row in rows:
+        units.setdefault((row["risorsa"], row["resource_id"], row["data"]), []).append(row["unita"])
+    return sorted(conn.execute(
+        select(Slot.appointment_id).distinct().where(
+            Slot.appointment_id != appointment_id,
+            or_(*(
+                and_(Slot.risorsa == risorsa, Slot.resource_id == resource_id, Slot.data == giorno,
+                     Slot.unita.between(min(unita), max(unita)))
+                for (risorsa, resource_id, giorno), unita in units.items()
+            ))
+        )
+    ).scalars())
+
+
+def appointment_slots(conn: Connection) -> None:
+    """Tabella di occupazione, popolata con gli appuntamenti attivi.
+
+    Le sovrapposizioni già presenti (doppie prenotazioni passate) non possono
+    entrare nella tabella: la migrazione le cerca tutte e fallisce con
+    DoubleBookingError, che elenca gli appuntamenti in conflitto. La
+    transazione viene annullata e nessuna prenotazione resta senza occupazione.
+    """
+    Slot = models.AppointmentSlot
+    Slot.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(Slot.appointment_id).limit(1)).first():
+        return
+
+    Appointment = models.Appointment
+    result = conn.execution_options(stream_results=True).execute(
+        select(
+            Appointment.id,
+            Appointment.doctor_id,
+            Appointment.room_id,
+            Appointment.data_appuntamento,
+            Appointment.ora_inizio,
+            Appointment.durata_minuti
+        ).where(Appointment.stato != 'cancellato')
+    )
+    # Le unità già occupate vengono saltate per completare la scansione e trovare tutti i conflitti
+    stmt = insert(Slot).prefix_with("OR IGNORE", dialect="sqlite").prefix_with("IGNORE", dialect="mysql")
+    conflicts: Dict[int, List[int]] = {}
+    for batch in result.partitions(1000):
+        expected = {appointment.id: slot_rows(*appointment) for appointment in batch}
+        rows = [row for appointment_rows in expected.values() for row in appointment_rows]
+        if not rows or conn.execute(stmt, rows).rowcount == len(rows):
+            continue
+        inserted = dict(conn.execute(
+            select(Slot.appointment_id, func.count()).where(
+                Slot.appointment_id.in_(list(expected))
+            ).group_by(Slot.appointment_id)
+        ).all())
+        for appointment_id, appointment_rows in expected.items():
+            if inserted.get(appointment_id, 0) < len(appointment_rows):
+                conflicts[appointment_id] = _slot_holders(conn, appointment_id, appointment_rows)
+    if conflicts:
+        raise DoubleBookingError(conflicts)
+
+
+def patient_search_token_collation(conn: Connection) -> None:
+    """Collazione binaria per i token di ricerca.
+
+    La ricerca per prefisso è il range token >= 'ros' AND token < 'rot': vale
+    solo se i token sono ordinati per byte. Con la collazione predefinita di
+    MySQL (utf8mb4_0900_ai_ci) la punteggiatura precede lettere e cifre, quindi
+    il limite di 'rossiz' ('rossi{') cade prima dei token cercati. SQLite
+    confronta già per byte.
+    """
+    if conn.dialect.name == "mysql":
+        conn.execute(text(
+            "ALTER TABLE patient_search_tokens "
+            "MODIFY token VARCHAR(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL"
+        ))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Schema iniziale dai modelli", baseline),
+    Migration(2, "Rango priorità e indici lista d'attesa", waiting_list_priority_rank),
+    Migration(3, "Indici composti appuntamenti", appointment_composite_indexes),
+    Migration(4, "Indice di ricerca pazienti", patient_search_tokens),
+    Migration(5, "Occupazione slot di medici e sale", appointment_slots),
+    Migration(6, "Collazione binaria dei token di ricerca", patient_search_token_collation),
+]
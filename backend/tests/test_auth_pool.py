@@ -0,0 +1,61 @@
+"""La verifica del token non aspetta il pool di bcrypt."""
+import threading
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import database
+from backend.app import models
+from backend.app.auth.auth_service import (
+    AUTH_MAX_CONCURRENCY,
+    create_access_token,
+    password_executor,
+    user_cache,
+)
+from backend.main import app
+from backend.migrations.runner import upgrade
+
+
+@pytest.fixture
+def client(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}", connect_args={"check_same_thread": False})
+    upgrade(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+
+    def override():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[database.get_db] = override
+    with engine.begin() as conn:
+        conn.execute(insert(models.Patient), [{
+            "id": 1, "nome": "Mario", "cognome": "Rossi", "codice_fiscale": "RSSMRA80A01H501U",
+            "data_nascita": date(1980, 1, 1), "email": "mario.rossi@example.com",
+            "password_hash": "x", "telefono": "3330000000"
+        }])
+    yield TestClient(app)
+    app.dependency_overrides.pop(database.get_db, None)
+    engine.dispose()
+
+
+def test_utente_non_in_cache_con_pool_bcrypt_occupato(client):
+    release = threading.Event()
+    # Ondata di login: tutti i thread di bcrypt occupati
+    busy = [password_executor.submit(release.wait, 30) for _ in range(AUTH_MAX_CONCURRENCY)]
+    try:
+        user_cache.clear()
+        response = client.get("/api/auth/me", headers={
+            "Authorization": "Bearer " + create_access_token({"sub": "1", "type": "patient"})
+        })
+        assert not any(future.done() for future in busy)
+    finally:
+        release.set()
+
+    assert response.status_code == 200
+    assert response.json()["email"] == "mario.rossi@example.com"
@@ -0,0 +1,42 @@
+"""Prenotazioni concorrenti: nessuna sovrapposizione tra appuntamenti attivi.
+
+Su SQLite un solo writer alla volta tiene il lock dell'intero database: le
+transazioni sono serializzate, quindi il caso verifica solo la correttezza del
+percorso di prenotazione, non l'assenza di doppie prenotazioni con writer
+davvero concorrenti. Per quello serve MySQL: il caso "mysql" usa DATABASE_URL
+quando punta a un server MySQL (il test vi scrive appuntamenti di prova),
+altrimenti viene saltato.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+MYSQL_URL = DATABASE_URL if DATABASE_URL.startswith("mysql") else None
+
+
+@pytest.mark.parametrize("database_url", [
+    pytest.param(None, id="sqlite"),
+    pytest.param(MYSQL_URL, id="mysql", marks=pytest.mark.skipif(
+        MYSQL_URL is None, reason="DATABASE_URL non punta a MySQL"
+    )),
+])
+def test_prenotazioni_concorrenti_senza_sovrapposizioni(database_url):
+    # Processo dedicato: DATABASE_URL va impostata prima di importare backend.database.
+    # Senza URL booking_stress crea un database SQLite temporaneo
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    completed = subprocess.run(
+        [sys.executable, "-m", "backend.benchmarks.booking_stress",
+         "--threads", "4", "--attempts", "200", "--doctors", "2", "--days", "1"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=600
+    )
+
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "Sovrapposizioni tra appuntamenti attivi: 0" in completed.stdout
+    assert "creata: " in completed.stdout
@@ -0,0 +1,92 @@
+"""Prenotazione concorrente confermata tra il controllo dei conflitti e l'insert dell'occupazione."""
+from datetime import date, time, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import database
+from backend.app import models
+from backend.app.auth.auth_service import create_access_token
+from backend.app.models.appointment_slot import slot_rows
+from backend.main import app
+from backend.migrations.runner import upgrade
+
+GIORNO = date.today() + timedelta(days=30)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bulk.db'}", connect_args={"check_same_thread": False})
+    upgrade(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+
+    def override():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[database.get_db] = override
+    app.dependency_overrides[database.get_read_db] = override
+    with engine.begin() as conn:
+        conn.execute(insert(models.Doctor), [{
+            "id": 1, "nome": "Anna", "cognome": "Verdi", "specializzazione": "Cardiologia",
+            "email": "anna.verdi@example.com", "password_hash": "x",
+            "orario_inizio": time(9), "orario_fine": time(13), "giorni_disponibili": "lun,mar,mer,gio,ven,sab,dom"
+        }])
+        conn.execute(insert(models.Patient), [{
+            "id": 1, "nome": "Mario", "cognome": "Rossi", "codice_fiscale": "RSSMRA80A01H501U",
+            "data_nascita": date(1980, 1, 1), "email": "mario.rossi@example.com",
+            "password_hash": "x", "telefono": "3330000000"
+        }])
+        # Occupazione scritta da una prenotazione concorrente: l'appuntamento non è
+        # ancora visibile alla lettura degli intervalli, la chiave sì
+        conn.execute(insert(models.AppointmentSlot), slot_rows(999, 1, None, GIORNO, time(9), 30))
+    yield factory
+    app.dependency_overrides.pop(database.get_db, None)
+    app.dependency_overrides.pop(database.get_read_db, None)
+    engine.dispose()
+
+
+def headers(user_id: int, user_type: str) -> dict:
+    return {"Authorization": "Bearer " + create_access_token({"sub": str(user_id), "type": user_type})}
+
+
+def appuntamento(ora: time) -> dict:
+    return {"doctor_id": 1, "patient_id": 1, "data_appuntamento": str(GIORNO),
+            "ora_inizio": str(ora), "durata_minuti": 30, "tipo_visita": "Controllo"}
+
+
+def appuntamenti(session_factory) -> int:
+    with session_factory() as db:
+        return db.scalar(select(func.count()).select_from(models.Appointment))
+
+
+def test_lotto_in_conflitto_con_prenotazione_concorrente(session_factory):
+    response = TestClient(app).post("/api/appointments/bulk", headers=headers(1, "doctor"), json={
+        "appointments": [appuntamento(time(10)), appuntamento(time(9))]
+    })
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Orario appena occupato da un'altra prenotazione"
+    assert appuntamenti(session_factory) == 0
+
+
+def test_prenotazione_singola_in_conflitto(session_factory):
+    response = TestClient(app).post("/api/appointments/", headers=headers(1, "patient"), json=appuntamento(time(9)))
+
+    assert response.status_code == 409
+    assert appuntamenti(session_factory) == 0
+
+
+def test_lotto_senza_conflitti(session_factory):
+    response = TestClient(app).post("/api/appointments/bulk", headers=headers(1, "doctor"), json={
+        "appointments": [appuntamento(time(10)), appuntamento(time(11))]
+    })
+
+    assert response.status_code == 200
+    assert response.json()["creati"] == 2
+    assert appuntamenti(session_factory) == 2
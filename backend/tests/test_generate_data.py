@@ -0,0 +1,20 @@
+"""Il generatore si può rilanciare su un database già popolato."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def test_seconda_generazione_sullo_stesso_database(tmp_path):
+    # Processo dedicato: DATABASE_URL va impostata prima di importare backend.database
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'generated.db'}")
+    for seed in ("1", "2"):
+        # Poche sale, condivise tra le due esecuzioni: le collisioni sono certe
+        completed = subprocess.run(
+            [sys.executable, "-m", "backend.generate_data",
+             "--doctors", "3", "--patients", "20", "--months", "1", "--rooms", "2", "--seed", seed],
+            cwd=ROOT, env=env, capture_output=True, text=True, timeout=300
+        )
+        assert completed.returncode == 0, completed.stdout + completed.stderr
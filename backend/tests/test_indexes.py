@@ -0,0 +1,22 @@
+"""Le query calde devono usare gli indici creati dalle migrazioni."""
+import pytest
+from sqlalchemy import create_engine
+
+from backend.migrations.explain import check_index_usage, hot_queries
+from backend.migrations.runner import upgrade
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('indexes') / 'schema.db'}")
+    upgrade(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_ogni_query_calda_usa_il_suo_indice(engine):
+    checks = check_index_usage(engine)
+
+    assert [check.nome for check in checks] == [nome for nome, _, _ in hot_queries()]
+    for check in checks:
+        assert check.ok, f"{check.nome}: atteso {check.indice}, piano {check.piano}"
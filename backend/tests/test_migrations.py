@@ -0,0 +1,82 @@
+"""Migrazione 5: occupazione slot con doppie prenotazioni già presenti."""
+from datetime import date, time
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select, update
+
+from backend.app import models
+from backend.app.services.scheduling import DoctorSchedule
+from backend.migrations.runner import applied_versions, upgrade
+from backend.migrations.steps import DoubleBookingError
+
+# Lunedì: giorno lavorativo del medico della fixture
+GIORNO = date(2024, 3, 4)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    # Database esistente: appuntamenti inseriti senza tabella di occupazione
+    models.Doctor.__table__.create(engine)
+    models.Patient.__table__.create(engine)
+    models.Room.__table__.create(engine)
+    models.Appointment.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Doctor), [{
+            "id": 1, "nome": "Anna", "cognome": "Verdi", "specializzazione": "Cardiologia",
+            "email": "anna.verdi@example.com", "password_hash": "x",
+            "orario_inizio": time(9), "orario_fine": time(13), "giorni_disponibili": "lun,mar,mer,gio,ven"
+        }])
+        conn.execute(insert(models.Patient), [{
+            "id": 1, "nome": "Mario", "cognome": "Rossi", "codice_fiscale": "RSSMRA80A01H501U",
+            "data_nascita": date(1980, 1, 1), "email": "mario.rossi@example.com",
+            "password_hash": "x", "telefono": "3330000000"
+        }])
+        conn.execute(insert(models.Appointment), [
+            {"id": 1, "doctor_id": 1, "patient_id": 1, "data_appuntamento": GIORNO,
+             "ora_inizio": time(9), "durata_minuti": 30, "tipo_visita": "Controllo", "stato": "programmato"},
+            # Sovrapposto al primo
+            {"id": 2, "doctor_id": 1, "patient_id": 1, "data_appuntamento": GIORNO,
+             "ora_inizio": time(9, 15), "durata_minuti": 30, "tipo_visita": "Controllo", "stato": "programmato"},
+            {"id": 3, "doctor_id": 1, "patient_id": 1, "data_appuntamento": GIORNO,
+             "ora_inizio": time(10), "durata_minuti": 30, "tipo_visita": "Controllo", "stato": "programmato"},
+            # Cancellato: non occupa
+            {"id": 4, "doctor_id": 1, "patient_id": 1, "data_appuntamento": GIORNO,
+             "ora_inizio": time(10), "durata_minuti": 30, "tipo_visita": "Controllo", "stato": "cancellato"},
+        ])
+    yield engine
+    engine.dispose()
+
+
+def test_appuntamenti_dentro_l_orario_del_medico(engine):
+    with engine.connect() as conn:
+        schedule = DoctorSchedule.from_doctor(conn.execute(select(models.Doctor)).one())
+    assert schedule.works_on(GIORNO)
+    assert {time(9), time(10)} <= set(schedule.slot_times)
+
+
+def test_doppie_prenotazioni_bloccano_la_migrazione(engine):
+    with pytest.raises(DoubleBookingError) as excinfo:
+        upgrade(engine)
+
+    assert excinfo.value.conflicts == {2: [1]}
+    assert "2 (con 1)" in str(excinfo.value)
+    assert 5 not in applied_versions(engine)
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.AppointmentSlot)).scalar() == 0
+
+
+def test_migrazione_completa_dopo_la_correzione(engine):
+    with pytest.raises(DoubleBookingError):
+        upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(update(models.Appointment).where(models.Appointment.id == 2).values(stato="cancellato"))
+
+    assert [migration.version for migration in upgrade(engine)] == [5, 6]
+    with engine.connect() as conn:
+        occupati = conn.execute(
+            select(models.AppointmentSlot.appointment_id, func.count()).group_by(
+                models.AppointmentSlot.appointment_id
+            )
+        ).all()
+    assert dict(occupati) == {1: 6, 3: 6}
@@ -0,0 +1,62 @@
+"""Ricerca per prefisso sull'indice dei token."""
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend.app import models
+from backend.app.services.patient_search import search_statement, search_terms
+from backend.migrations.runner import upgrade
+
+PAZIENTI = [
+    ("Marco", "Rizzo", "RZZMRC80A01H501A"),
+    ("Ana", "Ruiz", "RZUNAA85B41H501B"),
+    ("Luca", "Rossi", "RSSLCU90C01H501C"),
+    ("Sara", "Rossini", "RSSSRA92D41H501D"),
+    ("Paolo", "Bianchi", "BNCPLA70E01F205E"),
+]
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('search') / 'search.db'}")
+    upgrade(engine)
+    with Session(engine) as session:
+        for i, (nome, cognome, codice_fiscale) in enumerate(PAZIENTI):
+            session.add(models.Patient(
+                nome=nome,
+                cognome=cognome,
+                codice_fiscale=codice_fiscale,
+                data_nascita=date(1980, 1, 1),
+                email=f"paziente{i}@example.com",
+                password_hash="x",
+                telefono="3330000000"
+            ))
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def cerca(db, search):
+    return [patient.cognome for patient in db.scalars(search_statement(search_terms(search)))]
+
+
+@pytest.mark.parametrize("search, attesi", [
+    ("rizz", ["Rizzo"]),
+    ("ruiz", ["Ruiz"]),
+    ("riz", ["Rizzo"]),
+    ("r", ["Rizzo", "Rossi", "Rossini", "Ruiz"]),
+])
+def test_prefisso_che_termina_in_z(db, search, attesi):
+    assert sorted(cerca(db, search)) == attesi
+
+
+def test_prefisso_che_termina_in_cifra(db):
+    assert cerca(db, "rsslcu9") == ["Rossi"]
+    assert cerca(db, "rssgli9") == []
+
+
+def test_corrispondenza_esatta_prima_del_prefisso(db):
+    assert cerca(db, "rossi") == ["Rossi", "Rossini"]
+    assert cerca(db, "sara rossi") == ["Rossini"]
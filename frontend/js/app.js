@@ -2,6 +2,8 @@ const API_URL = 'http://localhost:8000/api';
 
 let selectedSlot = null;
 let appointmentToCancel = null;
+let slotsSnapshot = null;
+let availabilityStream = null;
 
 // Check authentication
 function checkAuth() {
@@ -71,6 +73,32 @@ function formatTime(timeStr) {
     return timeStr.substring(0, 5);
 }
 
+// Espande la risposta compatta di available-slots (bitmask per medico e giorno)
+// nella lista di slot del formato standard. Le bitmask arrivano fino a 48 bit:
+// si usa l'aritmetica, non gli operatori bit a bit che lavorano a 32 bit.
+function expandCompactSlots(data) {
+    const slots = [];
+    data.doctors.forEach(doctor => {
+        const [h, m] = doctor.ora_inizio.split(':').map(Number);
+        const startMinute = h * 60 + m;
+        Object.entries(doctor.giorni).sort().forEach(([giorno, mask]) => {
+            for (let i = 0; mask > 0; i++, mask = Math.floor(mask / 2)) {
+                if (mask % 2 === 0) continue;
+                const minute = startMinute + i * data.slot_minuti;
+                const ora = `${String(Math.floor(minute / 60)).padStart(2, '0')}:${String(minute % 60).padStart(2, '0')}:00`;
+                slots.push({
+                    data: giorno,
+                    ora: ora,
+                    doctor_id: doctor.doctor_id,
+                    nome_medico: doctor.nome_medico,
+                    specializzazione: doctor.specializzazione
+                });
+            }
+        });
+    });
+    return slots;
+}
+
 function getStatusBadge(status) {
     const badges = {
         'programmato': '<span class="badge badge-info">Programmato</span>',
@@ -105,9 +133,12 @@ async function loadSpecializations() {
 document.getElementById('booking-form').addEventListener('submit', async (e) => {
     e.preventDefault();
     
-    const patientId = localStorage.getItem('user_id');
     const specializzazione = document.getElementById('specializzazione').value;
-    
+    await loadAvailableSlots(specializzazione, true);
+});
+
+// Snapshot compatto degli slot liberi, poi aggiornamenti in push
+async function loadAvailableSlots(specializzazione, notify) {
     try {
         const today = new Date().toISOString().split('T')[0];
         const endDate = new Date();
@@ -115,22 +146,81 @@ document.getElementById('booking-form').addEventListener('submit', async (e) =>
         const endDateStr = endDate.toISOString().split('T')[0];
         
         const response = await fetch(
-            `${API_URL}/appointments/available-slots?specializzazione=${specializzazione}&start_date=${today}&end_date=${endDateStr}`,
+            `${API_URL}/appointments/available-slots?specializzazione=${specializzazione}&start_date=${today}&end_date=${endDateStr}&format=compact`,
             { headers: getAuthHeaders() }
         );
         const data = await response.json();
+        slotsSnapshot = { ...data, start_date: today, end_date: endDateStr };
+        subscribeAvailability(specializzazione);
+        const slots = expandCompactSlots(data);
         
-        if (data.available_slots.length === 0) {
+        if (slots.length === 0) {
             showAlert('Nessuna disponibilità trovata per questa specializzazione', 'warning');
             return;
         }
         
-        displayAvailableSlots(data.available_slots);
-        showAlert(`Trovati ${data.total} slot disponibili`, 'success');
+        displayAvailableSlots(slots);
+        if (notify) {
+            showAlert(`Trovati ${data.total} slot disponibili`, 'success');
+        }
     } catch (error) {
         showAlert('Errore nella ricerca delle disponibilità', 'error');
     }
-});
+}
+
+function subscribeAvailability(specializzazione) {
+    closeAvailabilityStream();
+    availabilityStream = new EventSource(
+        `${API_URL}/appointments/availability/stream?specializzazione=${encodeURIComponent(specializzazione)}`
+    );
+    availabilityStream.addEventListener('availability', (event) => {
+        applyAvailabilityDelta(JSON.parse(event.data));
+    });
+    // Aggiornamenti persi: si ricarica lo snapshot
+    availabilityStream.addEventListener('resync', () => loadAvailableSlots(specializzazione, false));
+}
+
+function closeAvailabilityStream() {
+    if (availabilityStream) {
+        availabilityStream.close();
+        availabilityStream = null;
+    }
+}
+
+// Ogni evento contiene la bitmask completa degli slot liberi di una giornata
+function applyAvailabilityDelta(delta) {
+    if (!slotsSnapshot || delta.data < slotsSnapshot.start_date || delta.data > slotsSnapshot.end_date) {
+        return;
+    }
+    let doctor = slotsSnapshot.doctors.find(d => d.doctor_id === delta.doctor_id);
+    if (!doctor) {
+        if (!delta.liberi) return;
+        doctor = {
+            doctor_id: delta.doctor_id,
+            nome_medico: delta.nome_medico,
+            specializzazione: delta.specializzazione,
+            ora_inizio: delta.ora_inizio,
+            giorni: {}
+        };
+        slotsSnapshot.doctors.push(doctor);
+    }
+    if (delta.liberi) {
+        doctor.giorni[delta.data] = delta.liberi;
+    } else {
+        delete doctor.giorni[delta.data];
+    }
+    
+    const slots = expandCompactSlots(slotsSnapshot);
+    if (selectedSlot && !slots.some(slot => isSameSlot(slot, selectedSlot))) {
+        selectedSlot = null;
+        showAlert('L\'orario selezionato non è più disponibile', 'warning');
+    }
+    displayAvailableSlots(slots);
+}
+
+function isSameSlot(a, b) {
+    return a.doctor_id === b.doctor_id && a.data === b.data && a.ora === b.ora;
+}
 
 // Display Available Slots
 function displayAvailableSlots(slots) {
@@ -151,7 +241,7 @@ function displayAvailableSlots(slots) {
     
     limitedSlots.forEach(slot => {
         const slotDiv = document.createElement('div');
-        slotDiv.className = 'slot';
+        slotDiv.className = selectedSlot && isSameSlot(slot, selectedSlot) ? 'slot selected' : 'slot';
         slotDiv.innerHTML = `
             <div class="slot-time">${formatTime(slot.ora)}</div>
             <div class="slot-info">${formatDate(slot.data)}</div>
@@ -204,6 +294,8 @@ async function confirmBooking() {
             showAlert('Appuntamento prenotato con successo!', 'success');
             document.getElementById('booking-form').reset();
             document.getElementById('available-slots').classList.add('hidden');
+            closeAvailabilityStream();
+            slotsSnapshot = null;
             selectedSlot = null;
         } else {
             const error = await response.json();